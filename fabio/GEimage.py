@@ -48,12 +48,15 @@ __copyright__ = "2007 APS; 2010-2015 ESRF"
 __licence__ = "MIT"
 
 
+import os
+import threading
 import numpy
 import struct
 import logging
 logger = logging.getLogger(__name__)
 from .fabioimage import FabioImage
-from .fabioutils import next_filename, previous_filename
+from . import fabioutils
+from .fabioutils import next_filename, previous_filename, OrderedDict
 
 GE_HEADER_INFO = [
     # Name, length in bytes, format for struct (None means string)
@@ -213,8 +216,148 @@ GE_HEADER_INFO = [
     ('VFPAquisition', 2000, None),
     ('Comment', 200, None)]
 
+# GE files are always little-endian
+_PIX_DTYPE = numpy.dtype("<u2")
+
+_HEADER_NAMES = [name for name, _, _ in GE_HEADER_INFO]
+# The whole header is decoded at once, strings being read as "<n>s" fields
+_HEADER_STRUCT = struct.Struct("<" + "".join(("%ds" % nbytes) if fmt is None else fmt[1:]
+                                             for _, nbytes, fmt in GE_HEADER_INFO))
+
+
+def _is_positional(infile):
+    """Returns True if `infile` is read with positional reads (preadv).
+
+    Positional reads do not use the file pointer, so they can be performed
+    concurrently from several threads; they also release the GIL.
+    """
+    return isinstance(infile, fabioutils.File) and hasattr(os, "preadv")
+
+
+def _read_at(infile, offset, size, buf=None):
+    """Read `size` bytes from `infile` starting at `offset`.
+
+    Data are read directly into a writable buffer, without the intermediate
+    bytes object. On regular files `os.preadv` is used, which neither moves
+    the file pointer nor needs a seek.
+
+    :param infile: opened file or stream
+    :param int offset: position in the file, in bytes
+    :param int size: number of bytes to read
+    :param buf: writable buffer of `size` bytes to fill, allocated if None
+    :return: the filled buffer
+    """
+    if buf is None:
+        buf = bytearray(size)
+    if _is_positional(infile):
+        nbytes = os.preadv(infile.fileno(), [buf], offset)
+    else:
+        if infile.tell() != offset:
+            # Sequential reads are already at the right position
+            infile.seek(offset, os.SEEK_SET)
+        if hasattr(infile, "readinto"):
+            nbytes = infile.readinto(buf)
+        else:
+            raw = infile.read(size)
+            nbytes = len(raw)
+            buf[:nbytes] = raw
+    if nbytes != size:
+        raise IOError("Truncated GE file: expected %s bytes at offset %s, got %s" % (size, offset, nbytes))
+    return buf
+
+
+def _advise(infile, offset, length, advice):
+    """Give an access-pattern hint to the kernel for a regular file.
+
+    This is a no-op on streams and on systems without posix_fadvise.
+
+    :param infile: opened file
+    :param int offset: start of the region, in bytes
+    :param int length: size of the region, 0 meaning up to the end
+    :param str advice: name of the advice, like "POSIX_FADV_SEQUENTIAL"
+    """
+    if isinstance(infile, fabioutils.File) and hasattr(os, advice):
+        try:
+            os.posix_fadvise(infile.fileno(), offset, length, getattr(os, advice))
+        except (OSError, ValueError) as err:
+            logger.debug("posix_fadvise failed: %s", err)
+
+
+def _unpack_12bits(buf, out=None):
+    """Unpack 12 bits pixels, stored as 2 pixels in 3 bytes.
+
+    The decoding is vectorized over all the byte triplets at once:
+    pixel 2i uses byte 3i and the low nibble of byte 3i+1, pixel 2i+1 uses
+    the high nibble of byte 3i+1 and byte 3i+2.
+
+    :param buf: raw bytes, its size should be a multiple of 3
+    :param out: 1D "<u2" array to fill, allocated if None
+    :rtype: numpy.ndarray
+    """
+    triplets = numpy.frombuffer(buf, dtype=numpy.uint8)
+    triplets = triplets[:triplets.size - triplets.size % 3].reshape(-1, 3).astype(numpy.uint16)
+    if out is None:
+        out = numpy.empty(2 * len(triplets), dtype=_PIX_DTYPE)
+    out[0::2] = triplets[:, 0] | ((triplets[:, 1] & 0x0F) << 8)
+    out[1::2] = (triplets[:, 1] >> 4) | (triplets[:, 2] << 4)
+    return out
+
+
+_FRAME_READERS = {}
+"""Cache of the frame readers, indexed by geometry"""
+
+
+def _get_frame_reader(header_size, frame_shape, depth):
+    """Returns a function reading frames of a given geometry.
+
+    The geometry is bound once in a closure so that reading a frame needs no
+    header lookup. Readers are cached: all the files produced by a detector
+    share the same one.
+
+    :param int header_size: size of the headers, in bytes
+    :param tuple frame_shape: number of rows and columns of a frame
+    :param int depth: number of bits per pixel, 12 or 16
+    :return: function(infile, first, count, out=None) -> 3D array
+    """
+    key = (header_size, frame_shape, depth)
+    reader = _FRAME_READERS.get(key)
+    if reader is not None:
+        return reader
+    frame_nbytes = frame_shape[0] * frame_shape[1] * depth // 8
+    # shape of a block of a single frame, the most common case
+    single_shape = (1,) + frame_shape
+
+    def block_shape(count):
+        return single_shape if count == 1 else (count,) + frame_shape
+
+    if depth == 12:
+        def reader(infile, first, count, out=None):
+            buf = _read_at(infile, header_size + first * frame_nbytes, count * frame_nbytes)
+            block = _unpack_12bits(buf, None if out is None else out.reshape(-1))
+            return block.reshape(block_shape(count))
+    else:
+        def reader(infile, first, count, out=None):
+            offset = header_size + first * frame_nbytes
+            if out is None:
+                # The file is little-endian: no byteswap is needed on big-endian hosts
+                block = numpy.frombuffer(_read_at(infile, offset, count * frame_nbytes), _PIX_DTYPE)
+            else:
+                _read_at(infile, offset, count * frame_nbytes, out.reshape(-1).view(numpy.uint8))
+                block = out
+            return block.reshape(block_shape(count))
+
+    _FRAME_READERS[key] = reader
+    return reader
+
 
 class GeImage(FabioImage):
+    """
+    FabIO image class for GE a-Si Angio detector files.
+
+    Different GeImage objects (including those returned by getframe) can be
+    used from different threads, but a single object is not thread-safe as
+    reading a frame updates its data.
+    """
 
     DESCRIPTION = "GE a-Si Angio detector file format"
 
@@ -222,17 +365,87 @@ class GeImage(FabioImage):
 
     _need_a_seek_to_read = True
 
+    _filename = None
+    sequencefilename = None
+
+    def __init__(self, data=None, header=None, cache_frames=0):
+        """
+        Generic constructor
+
+        :param data: numpy array of values
+        :param header: dict or ordereddict with metadata
+        :param int cache_frames: number of decoded frames to keep in memory
+            for files which can not be memory-mapped (0 to disable the cache).
+            Cached frames are read-only and shared with getframe results.
+        """
+        FabioImage.__init__(self, data, header)
+        self._cache_frames = cache_frames
+        self._frame_cache = None
+        self._mmap = None
+        self._infile = None
+        self._lock = threading.Lock()
+        self._header_size = None
+        self._frame_nbytes = None
+        self._frame_shape = None
+        self._depth = None
+        self._framebuf = None
+        self._frame_reader = None
+
     def _readheader(self, infile):
         """Read a GE image header"""
 
         infile.seek(0)
 
         self.header = self.check_header()
-        for name, nbytes, fmt in GE_HEADER_INFO:
-            if fmt is None:
-                self.header[name] = infile.read(nbytes)
-            else:
-                self.header[name] = struct.unpack(fmt, infile.read(nbytes))[0]
+        values = _HEADER_STRUCT.unpack(infile.read(_HEADER_STRUCT.size))
+        self.header.update(zip(_HEADER_NAMES, values))
+        self._finalize_header()
+
+    def _finalize_header(self):
+        """Pre-compute the frame geometry from the header, once per file"""
+        self._header_size = (self.header['StandardHeaderSizeInBytes'] +
+                             self.header['UserHeaderSizeInBytes'])
+        self._depth = self.header['ImageDepthInBits']  # hopefully 16
+        if self._depth not in (12, 16):
+            logger.warning("Using uint16 for GE but seems to be wrong, depth=%s bits" % self._depth)
+            self._depth = 16
+        self._frame_shape = (self.header['NumberOfRowsInFrame'],
+                             self.header['NumberOfColsInFrame'])
+        self._frame_nbytes = self._frame_shape[0] * self._frame_shape[1] * self._depth // 8
+        self._framebuf = None
+        self._frame_reader = _get_frame_reader(self._header_size, self._frame_shape, self._depth)
+
+    def _share_with(self, other):
+        """Share the pre-computed frame geometry, the memory map and the
+        opened file with another GeImage of the same file"""
+        other._header_size = self._header_size
+        other._frame_nbytes = self._frame_nbytes
+        other._frame_shape = self._frame_shape
+        other._depth = self._depth
+        other._frame_reader = self._frame_reader
+        other._mmap = self._mmap
+        other._infile = self._infile
+        other._lock = self._lock
+        other._cache_frames = self._cache_frames
+        other._frame_cache = self._frame_cache
+
+    def _get_infile(self):
+        """Returns the opened file, re-opening it if it was closed"""
+        if self._infile is None or self._infile.closed:
+            filename = self._filename
+            self._infile = self._open(self.sequencefilename, "rb")
+            self._filename = filename
+        return self._infile
+
+    def close(self):
+        """Release the file and the memory map.
+
+        Frames produced by getframe share the file with their parent: closing
+        them does not close the parent's file.
+        """
+        FabioImage.close(self)
+        self._infile = None
+        self._mmap = None
 
     def read(self, fname, frame=None):
         """
@@ -247,14 +460,54 @@ class GeImage(FabioImage):
         self.sequencefilename = fname
         self._readheader(infile)
         self._nframes = self.header['NumberOfFrames']
-        self._readframe(infile, frame)
-        infile.close()
+        if self._cache_frames > 0:
+            self._frame_cache = OrderedDict()
+        if self.nframes > 1:
+            # Frames are usually read in sequence: enable aggressive readahead
+            _advise(infile, self._header_size, 0, "POSIX_FADV_SEQUENTIAL")
+        self._mmap = self._map_frames(infile)
+        if self._mmap is None:
+            # Keep the file opened for the next frames
+            self._infile = infile
+            self._readframe(infile, frame)
+        else:
+            self._readframe(infile, frame)
+            infile.close()
         return self
 
-    def _makeframename(self):
+    def _map_frames(self, infile):
+        """Memory-map all the frames of a regular, uncompressed file.
+
+        The mapping is read-only: each frame is copied out of it when read,
+        so frames never share their data with the file nor with each other.
+
+        :return: a 3D numpy.memmap (frame, row, column) or None if the file
+            can not be mapped
+        """
+        if not isinstance(infile, fabioutils.File):
+            return None
+        if self._depth != 16:
+            return None
+        shape = (self.nframes,) + self._frame_shape
+        try:
+            return numpy.memmap(infile, dtype=_PIX_DTYPE, mode="r",
+                                offset=self._header_size, shape=shape)
+        except (ValueError, EnvironmentError) as err:
+            # Truncated or empty file, or unsupported file-system
+            logger.debug("Unable to memory-map %s: %s", self.sequencefilename, err)
+            return None
+
+    @property
+    def filename(self):
         """ The thing to be printed for the user to represent a frame inside
-        a file """
-        self.filename = "%s$%04d" % (self.sequencefilename, self.currentframe)
+        a file. It is only formatted on demand, unless explicitly set."""
+        if self._filename is None and self.sequencefilename is not None:
+            return "%s$%04d" % (self.sequencefilename, self.currentframe)
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        self._filename = value
 
     def _readframe(self, filepointer, img_num):
         """
@@ -263,54 +516,149 @@ class GeImage(FabioImage):
         # raises an exception if you give an invalid image
         # otherwise fills in self.data
         """
-        if(img_num > self.nframes or img_num < 0):
-            raise Exception("Bad image number")
-        imgstart = (self.header['StandardHeaderSizeInBytes'] +
-                    self.header['UserHeaderSizeInBytes'] +
-                    img_num * self.header['NumberOfRowsInFrame'] *
-                    self.header['NumberOfColsInFrame'] *
-                    self.header['ImageDepthInBits'] // 8)
-        # whence = 0 means seek from start of file
-        filepointer.seek(imgstart, 0)
-
-        bpp = self.header['ImageDepthInBits'] // 8  # hopefully 2
-        if bpp != 2:
-            logger.warning("Using uint16 for GE but seems to be wrong, bpp=%s" % bpp)
-
-        imglength = (self.header['NumberOfRowsInFrame'] *
-                     self.header['NumberOfColsInFrame'] * bpp)
-        data = numpy.frombuffer(filepointer.read(imglength), numpy.uint16).copy()
-        if not numpy.little_endian:
-            data.byteswap(True)
-        data.shape = (self.header['NumberOfRowsInFrame'],
-                      self.header['NumberOfColsInFrame'])
-        self.data = data
+        if not 0 <= img_num < self.nframes:
+            raise IndexError("Bad image number (requested %s, but found %d)" % (img_num, self.nframes))
+        if self._mmap is not None:
+            self.data = numpy.array(self._mmap[img_num])
+        elif self._frame_cache is not None:
+            self.data = self._get_frame_array(img_num)
+        else:
+            # The same buffer is reused for all the frames read by this object
+            if self._framebuf is None:
+                self._framebuf = numpy.empty(self._frame_shape, dtype=_PIX_DTYPE)
+            self._read_block(img_num, 1, out=self._framebuf)
+            self.data = self._framebuf
+            if img_num + 1 < self.nframes:
+                # Prefetch the next frame while the caller processes this one
+                _advise(self._infile,
+                        self._header_size + (img_num + 1) * self._frame_nbytes,
+                        self._frame_nbytes, "POSIX_FADV_WILLNEED")
+        # The shape comes from the data and statistics have to be recomputed
         self._shape = None
+        self.resetvals()
         self.currentframe = int(img_num)
-        self._makeframename()
+        self._filename = None
+
+    def _get_frame_array(self, img_num):
+        """Returns the data of a frame, using the cache of decoded frames
+
+        The least recently used frame is dropped when the cache is full.
+
+        :rtype: numpy.ndarray
+        """
+        with self._lock:
+            data = self._frame_cache.pop(img_num, None)
+        if data is None:
+            data = self._read_block(img_num, 1)[0]
+            data.flags.writeable = False
+        with self._lock:
+            self._frame_cache[img_num] = data
+            while len(self._frame_cache) > self._cache_frames:
+                self._frame_cache.popitem(last=False)
+        return data
+
+    def read_frames(self, indices=None):
+        """Read several frames of the file at once.
+
+        Runs of consecutive frames are fetched with a single read, so reading
+        a whole sequence costs one system call instead of one per frame.
+
+        :param indices: list of frame indices, all frames if None
+        :return: 3D array (frame, row, column) in the order of `indices`
+        :rtype: numpy.ndarray
+        """
+        if indices is None:
+            indices = numpy.arange(self.nframes)
+        else:
+            indices = numpy.asarray(indices, dtype=numpy.int64).ravel()
+        if len(indices) and (indices.min() < 0 or indices.max() >= self.nframes):
+            raise IndexError("Frame number out of range (requested %s, but found %d)" % (indices, self.nframes))
+        shape = (len(indices),) + self._frame_shape
+        if self._mmap is not None:
+            # a single copy, straight from the map into the result
+            return numpy.take(self._mmap, indices, axis=0,
+                              out=numpy.empty(shape, dtype=_PIX_DTYPE))
+
+        if len(indices) and (numpy.diff(indices) == 1).all():
+            # Contiguous range: a single read, no extra copy
+            return self._read_block(int(indices[0]), len(indices))
+        out = numpy.empty(shape, dtype=_PIX_DTYPE)
+        order = numpy.argsort(indices, kind="mergesort")
+        sorted_indices = indices[order]
+        # boundaries of the runs of consecutive frames
+        bounds = numpy.where(numpy.diff(sorted_indices) != 1)[0] + 1
+        bounds = [0] + bounds.tolist() + [len(indices)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if start < stop:
+                block = self._read_block(int(sorted_indices[start]), stop - start)
+                out[order[start:stop]] = block
+        return out
+
+    def _read_block(self, first, count, out=None):
+        """Read `count` consecutive frames starting at frame `first`
+
+        The file may be shared with other GeImage of the same file, so the
+        seek+read pair is protected by a lock. Regular files are read with
+        positional reads which do not need it and release the GIL, so that
+        several threads can read frames concurrently.
+
+        :param out: contiguous "<u2" array to read into, allocated if None
+        :rtype: numpy.ndarray
+        """
+        with self._lock:
+            infile = self._get_infile()
+            if not _is_positional(infile):
+                return self._frame_reader(infile, first, count, out)
+        return self._frame_reader(infile, first, count, out)
 
     def getframe(self, num):
         """
         Returns a frame as a new FabioImage object
         """
-        if num < 0 or num > self.nframes:
-            raise Exception("Requested frame number is out of range")
-        # Do a deep copy of the header to make a new one
-        newheader = {}
-        for k in self.header.keys():
-            newheader[k] = self.header[k]
-        frame = GeImage(header=newheader)
+        if not 0 <= num < self.nframes:
+            raise IndexError("Requested frame number is out of range (requested %s, but found %d)" % (num, self.nframes))
+        # Values are only numbers and bytes: a shallow copy is enough
+        frame = GeImage(header=self.header.copy(), cache_frames=self._cache_frames)
         frame._nframes = self.nframes
         frame.sequencefilename = self.sequencefilename
-        infile = frame._open(self.sequencefilename, "rb")
-        frame._readframe(infile, num)
-        infile.close()
+        self._share_with(frame)
+        frame._readframe(None, num)
         return frame
 
-    def next(self):
+    def advance(self, delta=1):
+        """
+        Move this object to another frame of the series, in place.
+
+        Unlike next/previous, no new object is created: self.data and
+        self.currentframe are updated. When the requested frame is out of
+        this file, the next (or previous) file of the series is read.
+
+        Note that the array self.data may be reused and overwritten by the
+        new frame: use self.data.copy() to keep the content of a frame.
+
+        :param int delta: number of frames to move, can be negative
+        :return: self
+        """
+        num = self.currentframe + delta
+        if 0 <= num < self.nframes:
+            self._readframe(None, num)
+            return self
+        if delta > 0:
+            filename = next_filename(self.sequencefilename)
+        else:
+            filename = previous_filename(self.sequencefilename)
+        self.close()
+        return self.read(filename)
+
+    def next(self, copy=True):
         """
         Get the next image in a series as a fabio image
+
+        :param bool copy: if False, move this object to the next frame
+            instead of creating a new one (see advance)
         """
+        if not copy:
+            return self.advance(1)
         if self.currentframe < (self.nframes - 1) and self.nframes > 1:
             return self.getframe(self.currentframe + 1)
         else:
@@ -319,10 +667,15 @@ class GeImage(FabioImage):
                 self.sequencefilename))
             return newobj
 
-    def previous(self):
+    def previous(self, copy=True):
         """
         Get the previous image in a series as a fabio image
+
+        :param bool copy: if False, move this object to the previous frame
+            instead of creating a new one (see advance)
         """
+        if not copy:
+            return self.advance(-1)
         if self.currentframe > 0:
             return self.getframe(self.currentframe - 1)
         else:
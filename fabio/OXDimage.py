@@ -543,7 +543,7 @@ class Section(object):
 
     def getSize(self, dtype):
         if dtype not in self._dictSize:
-            self._dictSize[dtype] = len(numpy.zeros(1, dtype=dtype).tostring())
+            self._dictSize[dtype] = numpy.dtype(dtype).itemsize
         return self._dictSize[dtype]
 
     def setData(self, key, offset, dtype, default=None):
@@ -42,6 +42,7 @@ __license__ = "GPLv3+"
 __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 __version__ = "17/10/2012"
 
+import os
 from .fabioimage import FabioImage
 import numpy
 import logging
@@ -93,7 +94,7 @@ class BinaryImage(FabioImage):
         self._bytecode = bytecode
         f = open(self.filename, "rb")
         dims = [dim2, dim1]
-        bpp = len(numpy.array(0, bytecode).tostring())
+        bpp = numpy.dtype(bytecode).itemsize
         size = dims[0] * dims[1] * bpp
 
         if offset >= 0:
@@ -116,10 +117,9 @@ class BinaryImage(FabioImage):
 
     def estimate_offset_value(self, fname, dim1, dim2, bytecode="int32"):
         "Estimates the size of a file"
-        with open(fname, "rb") as f:
-            bpp = len(numpy.array(0, bytecode).tostring())
-            size = dim1 * dim2 * bpp
-            totsize = len(f.read())
+        bpp = numpy.dtype(bytecode).itemsize
+        size = dim1 * dim2 * bpp
+        totsize = os.path.getsize(fname)
         logger.info('total size (bytes): %s', totsize)
         logger.info('expected data size given parameters (bytes): %s', size)
         logger.info('estimation of the offset value (bytes): %s', totsize - size)
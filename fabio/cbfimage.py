@@ -36,7 +36,7 @@ to conform to the specification of the IUCR
 """
 
 # get ready for python3
-from __future__ import with_statement, print_function, absolute_import
+from __future__ import with_statement, print_function, absolute_import, division
 
 __author__ = "Jérôme Kieffer"
 __contact__ = "jerome.kieffer@esrf.eu"
@@ -49,16 +49,55 @@ __version__ = ["Generated by CIF.py: Jan 2005 - Oct 2015",
 
 
 import os
+import re
+import mmap
 import logging
 import numpy
 from .fabioimage import FabioImage
+from . import fabioutils
 from .compression import compByteOffset, decByteOffset, md5sum
 from .third_party import six
-from .ext._cif import split_tokens
+
+try:
+    from collections.abc import MutableSequence
+except ImportError:
+    # Python 2
+    from collections import MutableSequence
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport
+    ThreadPoolExecutor = None
 
 
 logger = logging.getLogger(__name__)
 
+try:
+    from .ext._cif import split_tokens
+except ImportError as error:
+    logger.error("Failed to import _cif cython module, falling back on the pure python tokenizer: %s", error)
+    split_tokens = None
+
+_COMMENT_RE = re.compile(b"#[^\r\n]*")
+_LONG_LINE_RE = re.compile(b"[^\r\n]{81,}")
+# CIF keywords ending the values of a loop
+_LOOP_TERMINATORS = frozenset((b"loop_", b"stop_", b"global_", b"data_", b"save_"))
+# "key: value" or "key=value" lines of the binary section header
+_BINARY_HEADER_RE = re.compile(b"^(?:([^:\r\n]+):|([^=\r\n]+)=)([^\r\n]*)", re.M)
+_CIF_TOKEN_RE = re.compile(
+    # text field containing a binary section, which may contain "\n;"
+    b"(?ms)^;(?P<binary>(?:(?!^;).)*?--CIF-BINARY-FORMAT-SECTION--.*?--CIF-BINARY-FORMAT-SECTION--.*?)^;"
+    # text field
+    b"|^;(?P<text>.*?)^;"
+    # comment
+    b"|^#[^\r\n]*"
+    # quoted strings
+    b"|'(?P<single>.*?)'(?=\\s|\\Z)"
+    b"|\"(?P<double>.*?)\"(?=\\s|\\Z)"
+    # anything else
+    b"|(?P<bare>\\S+)")
+
 
 DATA_TYPES = {"signed 8-bit integer": "int8",
               "signed 16-bit integer": "int16",
@@ -76,6 +115,7 @@ MINIMUM_KEYS = ["X-Binary-Size-Fastest-Dimension",
                 "X-Binary-Number-of-Elements",
                 'X-Binary-Element-Type',
                 'X-Binary-Number-of-Elements']
+_MINIMUM_KEYS = frozenset(MINIMUM_KEYS)
 
 
 class CbfImage(FabioImage):
@@ -100,11 +140,27 @@ class CbfImage(FabioImage):
         """
         FabioImage.__init__(self, data, header)
         self.cif = CIF()
+        self._cbs = None
+        self._cbs_map = None
         self.cbs = None
         self.start_binary = None
         if fname is not None:  # load the file)
             self.read(fname)
 
+    @property
+    def cbs(self):
+        """Binary section of the file, up to the end of the binary data"""
+        if self._cbs_map is not None:
+            # the mapped section is only copied when asked for
+            self._cbs = self._cbs_map.tobytes()
+            self._cbs_map = None
+        return self._cbs
+
+    @cbs.setter
+    def cbs(self, value):
+        self._cbs = value
+        self._cbs_map = None
+
     @staticmethod
     def checkData(data=None):
         if data is None:
@@ -173,22 +229,12 @@ class CbfImage(FabioImage):
             self.cbs += inStream.read(self.PADDING)
             self.start_binary = self.cbs.find(self.STARTER)
         bin_headers = self.cbs[:self.start_binary]
-        lines = bin_headers.split(b"\n")
-        for line in lines[1:]:
-            if len(line) < 10:
-                break
-            try:
-                key, val = line.split(b':', 1)
-            except ValueError:
-                key, val = line.split(b'=', 1)
-            key = key.strip().decode("ASCII")
+        for key_colon, key_equal, val in _BINARY_HEADER_RE.findall(bin_headers):
+            key = (key_colon or key_equal).strip().decode("ASCII")
             self.header[key] = val.strip(b" \"\n\r\t").decode("ASCII")
-        missing = []
-        for item in MINIMUM_KEYS:
-            if item not in self.header:
-                missing.append(item)
+        missing = _MINIMUM_KEYS.difference(self.header)
         if missing:
-            logger.info("Mandatory keys missing in CBF file: " + ", ".join(missing))
+            logger.info("Mandatory keys missing in CBF file: " + ", ".join(sorted(missing)))
         # Compute image size
         try:
             slow = int(self.header['X-Binary-Size-Fastest-Dimension'])
@@ -207,7 +253,7 @@ class CbfImage(FabioImage):
         """Read and return the raw data chunk
 
         :param infile: opened file are correct position
-        :return: raw compressed stream
+        :return: raw compressed stream, as a memoryview on self.cbs
         """
         if self.CIF_BINARY_BLOCK_KEY not in self.cif:
             err = "Not key %s in CIF, no CBF image in %s" % (self.CIF_BINARY_BLOCK_KEY, self.filename)
@@ -215,19 +261,71 @@ class CbfImage(FabioImage):
             for kv in self.cif.items():
                 logger.debug("%s: %s", kv)
             raise RuntimeError(err)
+        start = self.start_binary + len(self.STARTER)
+        end = start + int(self.header["X-Binary-Size"])
         if self.cif[self.CIF_BINARY_BLOCK_KEY] == "CIF Binary Section":
-            self.cbs += infile.read(len(self.STARTER) + int(self.header["X-Binary-Size"]) - len(self.cbs) + self.start_binary)
+            if end > len(self.cbs):
+                mapped = self._map_binary_section(infile, start, end)
+                if mapped is not None:
+                    return mapped
+                self.cbs += infile.read(end - len(self.cbs))
         else:
-            if len(self.cif[self.CIF_BINARY_BLOCK_KEY]) > int(self.header["X-Binary-Size"]) + self.start_binary + len(self.STARTER):
-                self.cbs = self.cif[self.CIF_BINARY_BLOCK_KEY][:int(self.header["X-Binary-Size"]) + self.start_binary + len(self.STARTER)]
-            else:
-                self.cbs = self.cif[self.CIF_BINARY_BLOCK_KEY]
-        return self.cbs[self.start_binary + len(self.STARTER):]
+            self.cbs = self.cif[self.CIF_BINARY_BLOCK_KEY]
+        # A view avoids copying the (possibly large) compressed stream
+        return memoryview(self.cbs)[start:end]
+
+    def _map_binary_section(self, infile, start, end):
+        """Map the binary section of a regular file into memory
+
+        The pages are only read by the OS when the decoder accesses them,
+        and the compressed stream is only copied into a bytes object if
+        self.cbs is accessed.
+
+        :param infile: opened file, positioned just after self.cbs
+        :param int start: start of the binary data, relative to self.cbs
+        :param int end: end of the binary data, relative to self.cbs
+        :return: memoryview on the mapped binary data, or None if the file
+            can not be mapped
+        """
+        if not isinstance(infile, fabioutils.File):
+            return None
+        offset = infile.tell() - len(self.cbs)
+        try:
+            mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError) as error:
+            logger.debug("Unable to map %s: %s", self.filename, error)
+            return None
+        if offset + end > len(mapped):
+            # Truncated file, let the regular read handle it
+            mapped.close()
+            return None
+        # The view keeps the mapping alive as long as it is used
+        self._cbs_map = memoryview(mapped)[offset:offset + end]
+        return self._cbs_map[start:end]
 
-    def read(self, fname, frame=None, check_MD5=True, only_raw=False):
+    def read(self, fname, frame=None, check_MD5=True, only_raw=False, out=None, allocator=None):
         """Read in header into self.header and the data   into self.data
 
+        The image can be decoded into memory provided by the caller, for
+        example to reuse a single buffer along a scan::
+
+            buffers = {}
+
+            def allocator(shape, dtype):
+                key = shape, dtype
+                if key not in buffers:
+                    buffers[key] = numpy.empty(shape, dtype=dtype)
+                return buffers[key]
+
+            for fname in fnames:
+                image = cbfimage().read(fname, allocator=allocator)
+
         :param str fname: name of the file
+        :param out: writable C-contiguous array with as many elements as the
+            image, receiving the decoded data (cast to its dtype if needed)
+        :param allocator: callable called with the shape and the dtype of the
+            image, returning a writable C-contiguous numpy.ndarray which
+            receives it, used when out is not provided
         :return: fabioimage instance
         """
         self.filename = fname
@@ -241,7 +339,7 @@ class CbfImage(FabioImage):
 
         binary_data = self.read_raw_data(infile)
         if only_raw:
-            return binary_data
+            return binary_data.tobytes()
 
         if ("Content-MD5" in self.header) and check_MD5:
                 ref = numpy.string_(self.header["Content-MD5"])
@@ -250,8 +348,17 @@ class CbfImage(FabioImage):
                     logger.error("Checksum of binary data mismatch: expected %s, got %s" % (ref, obt))
 
         if self.header["conversions"] == "x-CBF_BYTE_OFFSET":
-            data = numpy.ascontiguousarray(self._readbinary_byte_offset(binary_data,), self._dtype)
-            data.shape = self._shape
+            size = self._shape[0] * self._shape[1]
+            if out is None and allocator is not None:
+                out = allocator(self._shape, self._dtype)
+            if out is None:
+                data = numpy.ascontiguousarray(self._readbinary_byte_offset(binary_data,), self._dtype)
+                data.shape = self._shape
+            else:
+                if out.size != size or not out.flags.c_contiguous or not out.flags.writeable:
+                    raise ValueError("Output buffer must be writable and C-contiguous with %s elements" % size)
+                self._readbinary_byte_offset(binary_data, out=out.reshape(-1))
+                data = out.reshape(self._shape)
             self.data = data
             self._shape = None
             self._dtype = None
@@ -261,16 +368,34 @@ class CbfImage(FabioImage):
         self.resetvals()
         return self
 
-    def _readbinary_byte_offset(self, raw_bytes):
+    def _readbinary_byte_offset(self, raw_bytes, out=None):
         """
         Read in a binary part of an x-CBF_BYTE_OFFSET compressed image
 
         :param str inStream: the binary image (without any CIF decorators)
+        :param out: optional 1D array receiving the result
         :return: a linear numpy array without shape and dtype set
         :rtype: numpy array
         """
         dim2, dim1 = self._shape
-        data = decByteOffset(raw_bytes, size=dim1 * dim2, dtype=self._dtype)
+        # Sums wrap around identically in any integer type: up to 32 bits
+        # per pixel, decode as int32 which halves the memory traffic
+        if self._dtype.itemsize <= 4:
+            dtype = "int32"
+        else:
+            dtype = "int64"
+        if out is None or out.dtype == dtype:
+            data = decByteOffset(raw_bytes, size=dim1 * dim2, dtype=dtype, out=out)
+        else:
+            # The sums only hold the values of the file type: an uint32 above
+            # 2**31 is a negative int32, which would be sign-extended if cast
+            # straight to a wider type
+            data = decByteOffset(raw_bytes, size=dim1 * dim2, dtype=dtype)
+            if data.dtype.itemsize == self._dtype.itemsize:
+                data = data.view(self._dtype)
+            out = out[:data.size]
+            out[...] = data
+            data = out
         assert len(data) == dim1 * dim2
         return data
 
@@ -340,6 +465,104 @@ class CbfImage(FabioImage):
 ################################################################################
 # CIF class
 ################################################################################
+class _LoopRows(MutableSequence):
+    """
+    Rows of a CIF loop, stored column-wise.
+
+    It behaves like the list of {key: value} dictionaries describing each
+    row of the loop, but only one list of values is kept per key: the
+    dictionaries are built when rows are accessed. Rows which are set or
+    inserted have to provide a value for each key of the loop.
+    """
+
+    def __init__(self, keys, columns):
+        """
+        :param list keys: keys of the loop, in order
+        :param dict columns: list of values for each key
+        """
+        self.keys = list(keys)
+        self.columns = columns
+
+    def __len__(self):
+        if not self.keys:
+            return 0
+        return len(self.columns[self.keys[0]])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return dict(zip(self.keys, [self.columns[key][index] for key in self.keys]))
+
+    def __setitem__(self, index, row):
+        if isinstance(index, slice):
+            rows = list(self)
+            rows[index] = row
+            self._set_rows(rows)
+            return
+        for key, value in zip(self.keys, self._row_values(row)):
+            self.columns[key][index] = value
+
+    def __delitem__(self, index):
+        for key in self.keys:
+            del self.columns[key][index]
+
+    def insert(self, index, row):
+        if not self.keys:
+            self.keys = list(row.keys())
+            self.columns = dict((key, []) for key in self.keys)
+        for key, value in zip(self.keys, self._row_values(row)):
+            self.columns[key].insert(index, value)
+
+    def __iter__(self):
+        for values in self.iter_values(self.keys):
+            yield dict(zip(self.keys, values))
+
+    def __eq__(self, other):
+        if isinstance(other, _LoopRows):
+            return self.keys == other.keys and self.columns == other.columns
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def _row_values(self, row):
+        """Returns the values of a row, in the order of the keys"""
+        if len(row) != len(self.keys):
+            raise ValueError("The row keys %s do not match the loop keys %s" % (list(row.keys()), self.keys))
+        return [row[key] for key in self.keys]
+
+    def _set_rows(self, rows):
+        """Replace all the rows of the loop"""
+        columns = dict((key, []) for key in self.keys)
+        for row in rows:
+            for key, value in zip(self.keys, self._row_values(row)):
+                columns[key].append(value)
+        self.columns = columns
+
+    def iter_values(self, keys):
+        """Iterate over the rows as tuples of values
+
+        :param list keys: keys of the columns to extract
+        """
+        return zip(*[self.columns[key] for key in keys])
+
+
 class CIF(dict):
     """
     This is the CIF class, it represents the CIF dictionary;
@@ -426,11 +649,15 @@ class CIF(dict):
         :rtype: boolean
         """
         try:
-            text.decode("ascii")
-        except UnicodeDecodeError:
-            return False
-        else:
-            return True
+            return text.isascii()
+        except AttributeError:
+            # Python < 3.7
+            try:
+                text.decode("ascii")
+            except UnicodeDecodeError:
+                return False
+            else:
+                return True
 
     @classmethod
     def _readCIF(cls, instream):
@@ -446,20 +673,13 @@ class CIF(dict):
         if "read" not in dir(instream):
             raise RuntimeError("CIF._readCIF(instream): I expected instream to be an opened file,\
              here I got %s type %s" % (instream, type(instream)))
-        out_bytes = numpy.string_("")
-        for sLine in instream:
-            nline = numpy.string_(sLine)
-            pos = nline.find(cls.HASH)
-            if pos >= 0:
-                if cls.isAscii(nline):
-                    out_bytes += nline[:pos] + numpy.string_(os.linesep)
-                if pos > 80:
-                    logger.warning("This line is too long and could cause problems in PreQuest: %s", sLine)
-            else:
-                out_bytes += nline
-                if len(sLine.strip()) > 80:
-                    logger.warning("This line is too long and could cause problems in PreQuest: %s", sLine)
-        return out_bytes
+        data = instream.read()
+        if not isinstance(data, six.binary_type):
+            data = numpy.string_(data)
+        data = _COMMENT_RE.sub(b"", data)
+        for match in _LONG_LINE_RE.finditer(data):
+            logger.warning("This line is too long and could cause problems in PreQuest: %s", match.group())
+        return numpy.string_(data)
 
     def _parseCIF(self, bytes_text):
         """
@@ -473,16 +693,20 @@ class CIF(dict):
         :return: Nothing, the data are incorporated at the CIF object dictionary
         :rtype: None
         """
-        loopidx = []
         looplen = []
         loop = []
-        fields = split_tokens(bytes_text)
+        if split_tokens is None:
+            fields = self._splitCIF(bytes_text)
+        else:
+            fields = split_tokens(bytes_text)
 
-        logger.debug("After split got %s fields of len: %s", len(fields), [len(i) for i in fields])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("After split got %s fields of len: %s", len(fields), [len(i) for i in fields])
 
-        for idx, field in enumerate(fields):
-            if field.lower() == self.LOOP:
-                loopidx.append(idx)
+        nloop = len(self.LOOP)
+        # keywords are case insensitive: only lower fields of the right length
+        loopidx = [idx for idx, field in enumerate(fields)
+                   if len(field) == nloop and field.lower() == self.LOOP]
         if loopidx:
             for i in loopidx:
                 loopone, length, keys = CIF._analyseOneLoop(fields, i)
@@ -490,8 +714,7 @@ class CIF(dict):
                 looplen.append(length)
 
             for i in range(len(loopidx) - 1, -1, -1):
-                f1 = fields[:loopidx[i]] + fields[loopidx[i] + looplen[i]:]
-                fields = f1
+                del fields[loopidx[i]:loopidx[i] + looplen[i]]
 
             self[self.LOOP.decode("ASCII")] = loop
 
@@ -511,83 +734,20 @@ class CIF(dict):
         """
         Separate the text in fields as defined in the CIF
 
+        Pure Python counterpart of the `split_tokens` extension: all the
+        tokenization is done by a single regular expression.
+
         :param bytes_text: the content of the CIF - file
         :type bytes_text:  8-bit string (str in python2 or bytes in python3)
         :return: list of all the fields of the CIF
         :rtype: list
         """
         fields = []
-        while True:
-            if len(bytes_text) == 0:
-                break
-            elif bytes_text[0] == cls.SINGLE_QUOTE:
-                idx = 0
-                finished = False
-                while not finished:
-                    idx += 1 + bytes_text[idx + 1:].find(cls.SINGLE_QUOTE)
-                    if idx >= len(bytes_text) - 1:
-                        fields.append(bytes_text[1:-1].strip())
-                        bytes_text = numpy.string_("")
-                        finished = True
-                        break
-
-                    if bytes_text[idx + 1] in cls.BLANK:
-                        fields.append(bytes_text[1:idx].strip())
-                        tmp_text = bytes_text[idx + 1:]
-                        bytes_text = tmp_text.strip()
-                        finished = True
-
-            elif bytes_text[0] == cls.DOUBLE_QUOTE:
-                idx = 0
-                finished = False
-                while not finished:
-                    idx += 1 + bytes_text[idx + 1:].find(cls.DOUBLE_QUOTE)
-                    if idx >= len(bytes_text) - 1:
-                        fields.append(bytes_text[1:-1].strip())
-                        bytes_text = numpy.string_("")
-                        finished = True
-                        break
-
-                    if bytes_text[idx + 1] in cls.BLANK:
-                        fields.append(bytes_text[1:idx].strip())
-                        tmp_text = bytes_text[idx + 1:]
-                        bytes_text = tmp_text.strip()
-                        finished = True
-
-            elif bytes_text[0] == cls.SEMICOLUMN:
-                if bytes_text[1:].strip().find(cls.BINARY_MARKER) == 0:
-                    idx = bytes_text[32:].find(cls.BINARY_MARKER)
-                    if idx == -1:
-                        idx = 0
-                    else:
-                        idx += 32 + len(cls.BINARY_MARKER)
-                else:
-                    idx = 0
-                finished = False
-                while not finished:
-                    idx += 1 + bytes_text[idx + 1:].find(cls.SEMICOLUMN)
-                    if bytes_text[idx - 1] in cls.EOL:
-                        fields.append(bytes_text[1:idx - 1].strip())
-                        tmp_text = bytes_text[idx + 1:]
-                        bytes_text = tmp_text.strip()
-                        finished = True
-            else:
-                res = bytes_text.split(None, 1)
-                if len(res) == 2:
-                    first, second = bytes_text.split(None, 1)
-                    if cls.isAscii(first):
-                        fields.append(first)
-                        bytes_text = second.strip()
-                        continue
-                start_binary = bytes_text.find(cls.BINARY_MARKER)
-                if start_binary > 0:
-                    end_binary = bytes_text[start_binary + 1:].find(cls.BINARY_MARKER) + start_binary + 1 + len(cls.BINARY_MARKER)
-                    fields.append(bytes_text[:end_binary])
-                    bytes_text = bytes_text[end_binary:].strip()
-                else:
-                    fields.append(bytes_text)
-                    bytes_text = numpy.string_("")
-                    break
+        for match in _CIF_TOKEN_RE.finditer(bytes_text):
+            kind = match.lastgroup
+            if kind is not None:
+                # comments have no group
+                fields.append(match.group(kind).strip())
         return fields
 
     @classmethod
@@ -595,11 +755,11 @@ class CIF(dict):
         """Processes one loop in the data extraction of the CIF file
         :param list fields: list of all the words contained in the cif file
         :param int start_idx: the starting index corresponding to the "loop_" key
-        :return: the list of loop dictionaries, the length of the data
-            extracted from the fields and the list of all the keys of the loop.
+        :return: the rows of the loop (a sequence of dictionaries, stored
+            column-wise), the length of the data extracted from the fields
+            and the list of all the keys of the loop.
         :rtype: tuple
         """
-        loop = []
         keys = []
         i = start_idx + 1
         finished = False
@@ -617,31 +777,21 @@ class CIF(dict):
                 break
             elif fields[i][0] == cls.UNDERSCORE:
                 break
-            elif fields[i] in (cls.LOOP, cls.STOP, cls.GLOBAL, cls.DATA, cls.SAVE):
+            elif fields[i] in _LOOP_TERMINATORS:
                 break
             else:
                 data.append(fields[i])
                 i += 1
-        k = 0
-
-        if len(data) < len(keys):
-            element = {}
-            for j in keys:
-                if k < len(data):
-                    element[j] = data[k]
-                else:
-                    element[j] = cls.QUESTIONMARK
-                k += 1
-            loop.append(element)
-
-        else:
-            for i in range(len(data) // len(keys)):
-                element = {}
-                for j in keys:
-                    element[j] = data[k]
-                    k += 1
-                loop.append(element)
-        return loop, 1 + len(keys) + len(data), keys
+        length = 1 + len(keys) + len(data)
+        nkeys = len(keys)
+        if len(data) < nkeys:
+            # a single incomplete row
+            data = data + [cls.QUESTIONMARK] * (nkeys - len(data))
+        nrows = len(data) // nkeys
+        columns = {}
+        for idx, key in enumerate(keys):
+            columns[key] = data[idx:nrows * nkeys:nkeys]
+        return _LoopRows(keys, columns), length, keys
 
 ##########################################
 # everything needed to  write a CIF file #
@@ -724,10 +874,13 @@ class CIF(dict):
                 lKeys = loop[0]
                 llData = loop[1]
                 lstStrCif += [" %s" % (sKey) for sKey in lKeys]
-                for lData in llData:
+                if isinstance(llData, _LoopRows):
+                    rows = llData.iter_values(lKeys)
+                else:
+                    rows = ([lData[key] for key in lKeys] for lData in llData)
+                for lValues in rows:
                     sLine = " "
-                    for key in lKeys:
-                        sRawValue = lData[key]
+                    for sRawValue in lValues:
                         if sRawValue.find("\n") > -1:  # should add value  between ;;
                             lstStrCif += [sLine, ";", str(sRawValue), ";"]
                             sLine = " "
@@ -770,15 +923,10 @@ class CIF(dict):
         :return: True if the key exists in the CIF dictionary and is non empty
         :rtype: boolean
         """
-        if not self.exists(self.LOOP):
+        loop_key = self.LOOP.decode("ASCII")
+        if not self.exists(loop_key):
             return False
-        bExists = False
-        if not bExists:
-            for i in self[self.LOOP]:
-                for j in i[0]:
-                    if j == sKey:
-                        bExists = True
-        return bExists
+        return sKey in set().union(*[loop[0] for loop in self[loop_key]])
 
     def loadCHIPLOT(self, _strFilename):
         """
@@ -793,53 +941,54 @@ class CIF(dict):
             errStr = "I cannot find the file %s" % _strFilename
             logger.error(errStr)
             raise IOError(errStr)
-        lInFile = open(_strFilename, "r").readlines()
         self["_audit_creation_method"] = 'From 2-D detector using FIT2D and CIFfile'
         self["_pd_meas_scan_method"] = "fixed"
-        self["_pd_spec_description"] = lInFile[0].strip()
-        try:
-            iLenData = int(lInFile[3])
-        except ValueError:
-            iLenData = None
         lOneLoop = []
-        try:
-            f2ThetaMin = float(lInFile[4].split()[0])
-            last = ""
-            for sLine in lInFile[-20:]:
-                if sLine.strip() != "":
-                    last = sLine.strip()
-            f2ThetaMax = float(last.split()[0])
-            limitsOK = True
-
-        except (ValueError, IndexError):
-            limitsOK = False
-            f2ThetaMin = 180.0
-            f2ThetaMax = 0
-#        print "limitsOK:", limitsOK
-        for sLine in lInFile[4:]:
-            sCleaned = sLine.split("#")[0].strip()
-            data = sCleaned.split()
-            if len(data) == 2:
-                if not limitsOK:
+        # limits, used if they can not be read from the first and last lines
+        f2ThetaMin = 180.0
+        f2ThetaMax = 0
+        first = None
+        last = ""
+        with open(_strFilename, "r") as infile:
+            lHeader = [infile.readline() for _ in range(4)]
+            self["_pd_spec_description"] = lHeader[0].strip()
+            for sLine in infile:
+                if first is None:
+                    first = sLine
+                sCleaned = sLine.strip()
+                if sCleaned:
+                    last = sCleaned
+                data = sLine.split("#")[0].split()
+                if len(data) == 2:
                     f2Theta = float(data[0])
                     if f2Theta < f2ThetaMin:
                         f2ThetaMin = f2Theta
                     if f2Theta > f2ThetaMax:
                         f2ThetaMax = f2Theta
-                lOneLoop.append({"_pd_meas_intensity_total": data[1]})
+                    lOneLoop.append(data[1])
+        try:
+            iLenData = int(lHeader[3])
+        except ValueError:
+            iLenData = None
+        try:
+            f2ThetaMin, f2ThetaMax = float(first.split()[0]), float(last.split()[0])
+        except (AttributeError, ValueError, IndexError):
+            pass
         if not iLenData:
             iLenData = len(lOneLoop)
         assert (iLenData == len(lOneLoop))
-        self["_pd_meas_2theta_range_inc"] = "%.4f" % ((f2ThetaMax - f2ThetaMin) / (iLenData - 1))
-        if self["_pd_meas_2theta_range_inc"] < 0:
-            self["_pd_meas_2theta_range_inc"] = abs(self["_pd_meas_2theta_range_inc"])
+        f2ThetaInc = (f2ThetaMax - f2ThetaMin) / (iLenData - 1)
+        if f2ThetaInc < 0:
+            f2ThetaInc = abs(f2ThetaInc)
             tmp = f2ThetaMax
             f2ThetaMax = f2ThetaMin
             f2ThetaMin = tmp
+        self["_pd_meas_2theta_range_inc"] = "%.4f" % f2ThetaInc
         self["_pd_meas_2theta_range_max"] = "%.4f" % f2ThetaMax
         self["_pd_meas_2theta_range_min"] = "%.4f" % f2ThetaMin
         self["_pd_meas_number_of_points"] = str(iLenData)
-        self[self.LOOP] = [[["_pd_meas_intensity_total"], lOneLoop]]
+        keys = ["_pd_meas_intensity_total"]
+        self[self.LOOP.decode("ASCII")] = [[keys, _LoopRows(keys, {keys[0]: lOneLoop})]]
 
     @staticmethod
     def LoopHasKey(loop, key):
@@ -852,3 +1001,29 @@ class CIF(dict):
 
 
 cbfimage = CbfImage
+
+
+def read_many(filenames, workers=None, out=None):
+    """Read several CBF files concurrently
+
+    The byte-offset decompression releases the GIL, so the frames are
+    decoded in parallel by a pool of threads.
+
+    :param filenames: list of CBF filenames
+    :param int workers: number of threads, the default of the executor if None
+    :param out: optional array with one slot per file (for example of shape
+        (len(filenames), dim2, dim1)) receiving the decoded images
+    :return: list of CbfImage instances, in the order of filenames
+    """
+    filenames = list(filenames)
+    if out is not None and len(out) != len(filenames):
+        raise ValueError("Expected an output buffer for each of the %s files" % len(filenames))
+
+    def read_one(index):
+        buf = None if out is None else out[index]
+        return CbfImage().read(filenames[index], out=buf)
+
+    if ThreadPoolExecutor is None or workers == 1:
+        return [read_one(i) for i in range(len(filenames))]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read_one, range(len(filenames))))
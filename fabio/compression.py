@@ -45,6 +45,7 @@ __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 
 
 import sys
+import struct
 import base64
 import hashlib
 import logging
@@ -55,6 +56,13 @@ logger = logging.getLogger(__name__)
 
 from .third_party import six
 
+# Escape sequences and escaped values of the byte-offset algorithm
+_KEY32 = b"\x00\x80"
+_KEY64 = b"\x00\x00\x00\x80"
+_INT16 = struct.Struct("<h")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+
 try:
     from .third_party import gzip
 except ImportError:
@@ -73,6 +81,12 @@ except ImportError:
     logger.error("Unable to import zlib module: disabling zlib compression")
     zlib = None
 
+try:
+    # ISA-L inflates about twice as fast as zlib, with the same API
+    from isal import isal_zlib as _inflate
+except ImportError:
+    _inflate = zlib
+
 if sys.platform != "win32":
     WindowsError = OSError
 
@@ -148,6 +162,30 @@ class ExternalCompressors(object):
 COMPRESSORS = ExternalCompressors()
 
 
+def _gunzip(stream):
+    """Decompress all the gzip members of a stream with zlib (or ISA-L),
+    ignoring any trailing garbage
+
+    :param stream: compressed data
+    :return: uncompressed stream or None if the stream is not valid
+    """
+    chunks = []
+    while stream:
+        decompressor = _inflate.decompressobj(_inflate.MAX_WBITS | 16)
+        try:
+            chunks.append(decompressor.decompress(stream))
+        except _inflate.error as error:
+            logger.debug("Unable to inflate the gzip stream: %s", error)
+            return None
+        if not getattr(decompressor, "eof", True):
+            # truncated stream
+            return None
+        stream = decompressor.unused_data
+        if stream[:2] != b"\x1f\x8b":
+            break
+    return b"".join(chunks)
+
+
 def decGzip(stream):
     """Decompress a chunk of data using the gzip algorithm from system or from Python
 
@@ -166,6 +204,10 @@ def decGzip(stream):
             else:
                 return uncompessed
 
+    if _inflate is not None:
+        uncompessed = _gunzip(stream)
+        if uncompessed is not None:
+            return uncompessed
     if gzip is None:
         raise ImportError("gzip module is not available")
     fileobj = six.BytesIO(stream)
@@ -202,64 +244,74 @@ def decZlib(stream):
     """
     Decompress a chunk of data using the zlib algorithm from Python
     """
-    if zlib is None:
+    if _inflate is None:
         raise ImportError("zlib module is not available")
-    return zlib.decompress(stream)
+    return _inflate.decompress(stream)
 
 
-def decByteOffset_numpy(stream, size=None, dtype="int64"):
+def decByteOffset_numpy(stream, size=None, dtype="int64", out=None):
     """
     Analyze a stream of char with any length of exception:
                 2, 4, or 8 bytes integers
 
+    All 0x80 markers are located in a single numpy pass: only the escaped
+    values are processed in Python while the 8-bit deltas, which are the vast
+    majority, are handled by numpy. The running sum is computed in place.
+
     :param stream: string representing the compressed data
     :param size: the size of the output array (of longInts)
+    :param out: optional pre-allocated 1D-ndarray receiving the result
     :return: 1D-ndarray
 
     """
     logger.debug("CBF decompression using Numpy")
-    listnpa = []
-    key16 = b"\x80"
-    key32 = b"\x00\x80"
-    key64 = b"\x00\x00\x00\x80"
-    shift = 1
-    while True:
-        idx = stream.find(key16)
-        if idx == -1:
-            listnpa.append(numpy.frombuffer(stream, dtype=numpy.int8))
-            break
-        listnpa.append(numpy.frombuffer(stream[:idx], dtype=numpy.int8))
-
-        if stream[idx + 1:idx + 3] == key32:
-            if stream[idx + 3:idx + 7] == key64:
+    raw = numpy.frombuffer(stream, dtype=numpy.int8)
+    # Deltas are stored directly in the output type: integer overflows wrap
+    # around identically in the running sum.
+    delta = raw.astype(dtype)
+    # bytes which are part of an escaped value and not deltas by themselves
+    escaped = numpy.zeros(raw.size, dtype=bool)
+    positions = []
+    values = []
+    end = 0
+    for idx in numpy.flatnonzero(raw == -128).tolist():
+        if idx < end:
+            # This 0x80 belongs to the value of the previous exception
+            continue
+        if stream[idx + 1:idx + 3] == _KEY32:
+            if stream[idx + 3:idx + 7] == _KEY64:
                 # 64 bits int
-                res = numpy.frombuffer(stream[idx + 7:idx + 15], dtype=numpy.int64)
-                listnpa.append(res)
-                shift = 15
+                end = idx + 15
+                value = _INT64.unpack_from(stream, idx + 7)[0]
             else:
                 # 32 bits int
-                res = numpy.frombuffer(stream[idx + 3:idx + 7], dtype=numpy.int32)
-                listnpa.append(res)
-                shift = 7
+                end = idx + 7
+                value = _INT32.unpack_from(stream, idx + 3)[0]
         else:  # int16
-            res = numpy.frombuffer(stream[idx + 1:idx + 3], dtype=numpy.int16)
-            listnpa.append(res)
-            shift = 3
-        stream = stream[idx + shift:]
-    if not numpy.little_endian:
-        for res in listnpa:
-            if res.dtype != numpy.int8:
-                res.byteswap(True)
-    return numpy.ascontiguousarray(numpy.hstack(listnpa), dtype).cumsum()
+            end = idx + 3
+            value = _INT16.unpack_from(stream, idx + 1)[0]
+        positions.append(idx)
+        values.append(value)
+        escaped[idx + 1:end] = True
+    if end:
+        # Wraps around like the deltas when the values do not fit in dtype
+        delta[positions] = numpy.array(values, dtype=numpy.int64).astype(delta.dtype)
+        delta = delta[numpy.logical_not(escaped)]
+    if out is None:
+        out = delta
+    else:
+        out = out[:delta.size]
+    return numpy.cumsum(delta, dtype=delta.dtype, out=out)
 
 
-def decByteOffset_cython(stream, size=None, dtype="int64"):
+def decByteOffset_cython(stream, size=None, dtype="int64", out=None):
     """
     Analyze a stream of char with any length of exception:
                 2, 4, or 8 bytes integers
 
     :param stream: string representing the compressed data
     :param size: the size of the output array (of longInts)
+    :param out: optional pre-allocated 1D-ndarray receiving the result
     :return: 1D-ndarray
 
     """
@@ -268,12 +320,18 @@ def decByteOffset_cython(stream, size=None, dtype="int64"):
         from .ext import byte_offset
     except ImportError as error:
         logger.error("Failed to import byte_offset cython module, falling back on numpy method: %s", error)
-        return decByteOffset_numpy(stream, size, dtype=dtype)
+        return decByteOffset_numpy(stream, size, dtype=dtype, out=out)
     else:
         if dtype == "int32":
-            return byte_offset.dec_cbf32(stream, size)
+            decode, native = byte_offset.dec_cbf32, numpy.int32
         else:
-            return byte_offset.dec_cbf(stream, size)
+            decode, native = byte_offset.dec_cbf, numpy.int64
+        if out is None or out.dtype == native:
+            return decode(stream, size, out=out)
+        data = decode(stream, size)
+        out = out[:data.size]
+        out[...] = data
+        return out
 
 
 decByteOffset = decByteOffset_cython
@@ -303,30 +361,30 @@ def compByteOffset_numpy(data):
     binary_blob = b""
     for stop in exceptions:
         if stop - start > 0:
-            binary_blob += delta[start:stop].astype(numpy.int8).tostring()
+            binary_blob += delta[start:stop].astype(numpy.int8).tobytes()
         exc = delta[stop]
         absexc = abs(exc)
         if absexc > 2147483647:  # 2**31-1
             binary_blob += b"\x80\x00\x80\x00\x00\x00\x80"
             if byteswap:
-                binary_blob += delta[stop:stop + 1].byteswap().tostring()
+                binary_blob += delta[stop:stop + 1].byteswap().tobytes()
             else:
-                binary_blob += delta[stop:stop + 1].tostring()
+                binary_blob += delta[stop:stop + 1].tobytes()
         elif absexc > 32767:  # 2**15-1
             binary_blob += b"\x80\x00\x80"
             if byteswap:
-                binary_blob += delta[stop:stop + 1].astype(numpy.int32).byteswap().tostring()
+                binary_blob += delta[stop:stop + 1].astype(numpy.int32).byteswap().tobytes()
             else:
-                binary_blob += delta[stop:stop + 1].astype(numpy.int32).tostring()
+                binary_blob += delta[stop:stop + 1].astype(numpy.int32).tobytes()
         else:  # >127
             binary_blob += b"\x80"
             if byteswap:
-                binary_blob += delta[stop:stop + 1].astype(numpy.int16).byteswap().tostring()
+                binary_blob += delta[stop:stop + 1].astype(numpy.int16).byteswap().tobytes()
             else:
-                binary_blob += delta[stop:stop + 1].astype(numpy.int16).tostring()
+                binary_blob += delta[stop:stop + 1].astype(numpy.int16).tobytes()
         start = stop + 1
     if start < delta.size:
-        binary_blob += delta[start:].astype(numpy.int8).tostring()
+        binary_blob += delta[start:].astype(numpy.int8).tobytes()
     return binary_blob
 
 
@@ -348,9 +406,9 @@ def compByteOffset_cython(data):
         return compByteOffset_numpy(data)
     else:
         if "int32" in str(data.dtype):
-            return byte_offset.comp_cbf32(data).tostring()
+            return byte_offset.comp_cbf32(data).tobytes()
         else:
-            return byte_offset.comp_cbf(data).tostring()
+            return byte_offset.comp_cbf(data).tobytes()
 
 
 compByteOffset = compByteOffset_cython
@@ -424,7 +482,7 @@ def compTY1(data):
     diff[we32] = 128
     diff += 127
     data_8 = diff.astype(numpy.uint8)
-    return data_8.tostring(), data_16.tostring(), data_32.tostring()
+    return data_8.tobytes(), data_16.tobytes(), data_32.tobytes()
 
 
 def decPCK(stream, dim1=None, dim2=None, overflowPix=None, version=None, normal_start=None, swap_needed=None):
@@ -50,7 +50,11 @@ Authors:
 
 import os
 import re
+import mmap
+import stat
 import string
+import tempfile
+import threading
 import logging
 import numpy
 
@@ -63,10 +67,18 @@ from . import compression as compression_module
 from . import fabioutils
 from .utils import deprecation
 
-from collections import namedtuple
+from collections import namedtuple, deque
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport
+    ThreadPoolExecutor = None
 
 BLOCKSIZE = 512
 MAX_BLOCKS = 40
+_EDF_HEADERSIZE_TAG = b"EDF_HeaderSize"
+_EDF_HEADERSIZE_VALUE = re.compile(b"\\s*=\\s*([+-]?\\d+)\\s*;")
 DATA_TYPES = {"SignedByte": numpy.int8,
               "Signed8": numpy.int8,
               "UnsignedByte": numpy.uint8,
@@ -101,6 +113,8 @@ except AttributeError:
     # not in your numpy
     logger.debug("No support for float128 in your code")
 
+DATA_TYPES_DTYPE = dict((key, numpy.dtype(value)) for key, value in DATA_TYPES.items())
+
 NUMPY_EDF_DTYPE = {"int8": "SignedByte",
                    "int16": "SignedShort",
                    "int32": "SignedInteger",
@@ -114,6 +128,15 @@ NUMPY_EDF_DTYPE = {"int8": "SignedByte",
                    "float128": "QuadrupleValue",
                    }
 
+_EDF_DTYPE_NAMES = {}
+for _key, _value in NUMPY_EDF_DTYPE.items():
+    try:
+        _EDF_DTYPE_NAMES[numpy.dtype(_key)] = _value
+    except TypeError:
+        # float128 not available
+        pass
+del _key, _value
+
 MINIMUM_KEYS = set(['HEADERID',
                     'IMAGE',  # Image numbers are used for sorting and must be different
                     'BYTEORDER',
@@ -122,12 +145,155 @@ MINIMUM_KEYS = set(['HEADERID',
                     'DIM_2',
                     'SIZE'])  # Size is thought to be essential for writing at least
 
+# Characters removed by toAscii(..., ";{}"): strings without them are kept as is
+_UNSAFE_HEADER_CHARS = re.compile("[^\x20-\x7e]|[;{}]")
+
+# Why would someone put null bytes in a header?
+_HEADER_WHITESPACE = string.whitespace + "\x00"
+
 DEFAULT_VALUES = {}
 # I do not define default values as they will be calculated at write time
 # JK20110415
 
+_COMPRESSION_DECODERS = {"GZIP": decGzip,
+                         "BZIP2": decBzip2,
+                         "ZLIB": decZlib}
+
+_COMPRESSION_NAMES = {}
+
+
+def _normalize_compression(value):
+    """
+    Normalize the value of the Compression key of a header
+
+    :param str value: value of the header, like "GZIP", "BYTE_OFFSET", "None"
+    :return: "OFFSET", "GZIP", "BZIP2", "ZLIB", the unknown uppercase
+        value, or None if the data are not compressed
+    """
+    name = _COMPRESSION_NAMES.get(value)
+    if name is None and value not in _COMPRESSION_NAMES:
+        name = value.upper()
+        if name.startswith("NO"):
+            name = None
+        elif "OFFSET" in name:
+            name = "OFFSET"
+        elif "GZIP" in name:
+            name = "GZIP"
+        elif "BZ" in name:
+            name = "BZIP2"
+        elif "Z" in name:
+            name = "ZLIB"
+        _COMPRESSION_NAMES[value] = name
+    return name
+
+
+def _pread(filename, offset, size):
+    """Read `size` bytes of a file starting at `offset`.
+
+    Uses a single positioned read when the platform provides `os.pread`,
+    so no seek is needed and the call is safe to run from several threads.
+
+    :param str filename: name of the file
+    :param int offset: position of the first byte
+    :param int size: number of bytes to read
+    :rtype: bytes
+    """
+    if not hasattr(os, "pread"):
+        with open(filename, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+    fd = os.open(filename, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        raw = os.pread(fd, size, offset)
+        if 0 < len(raw) < size:
+            # short read, keep reading until the end of the file
+            chunks = [raw]
+            offset += len(raw)
+            size -= len(raw)
+            while size > 0:
+                chunk = os.pread(fd, size, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+                size -= len(chunk)
+            raw = b"".join(chunks)
+    finally:
+        os.close(fd)
+    return raw
+
+
+def _find_header_end(buf, start=0, stop=None):
+    """Locate the end of an EDF header, "}\n" or "}\r\n", in a buffer.
+
+    Equivalent to `re.compile(b"}\r?\n").search(buf, start, stop)`, but the
+    closing braces are located with `find`, which scans the buffer much
+    faster than the regular expression engine.
+
+    :param buf: bytes or bytearray
+    :param int start: first position to search
+    :param int stop: the pattern must end before this position
+    :return: the start and end positions of the pattern, None if not found
+    """
+    if stop is None:
+        stop = len(buf)
+    find = buf.find
+    index = find(b"}", start, stop)
+    while index >= 0:
+        if buf[index + 1:index + 2] == b"\n":
+            end = index + 2
+        elif buf[index + 1:index + 3] == b"\r\n":
+            end = index + 3
+        else:
+            end = None
+        if end is not None:
+            if end <= stop:
+                return index, end
+            return None
+        index = find(b"}", index + 1, stop)
+    return None
+
+
+def _writev(fd, buffers):
+    """Write a list of buffers to a file descriptor with `os.writev`,
+    continuing after partial writes.
+
+    :param int fd: file descriptor opened for writing
+    :param list buffers: objects supporting the buffer protocol, as 1D bytes
+    """
+    buffers = [memoryview(buf) for buf in buffers if len(buf)]
+    while buffers:
+        written = os.writev(fd, buffers)
+        while written:
+            if written >= len(buffers[0]):
+                written -= len(buffers.pop(0))
+            else:
+                buffers[0] = buffers[0][written:]
+                written = 0
+
+
 HeaderBlockType = namedtuple("HeaderBlockType", "header_block, header_size, binary_size")
 
+_FrameIndexEntry = namedtuple("_FrameIndexEntry", "header, start, blobsize, size, shape, dtype, compression, swap_needed, incomplete_data")
+
+_FRAME_INDEX_CACHE = OrderedDict()
+"""Frame index of the files recently read, indexed by file identity
+(path, device, inode, size, modification and change times)"""
+
+_FRAME_INDEX_CACHE_SIZE = 128
+"""Maximum number of files kept in the frame index cache"""
+
+_FRAME_INDEX_LOCK = threading.Lock()
+
+
+def _frame_index_key(infile):
+    """Returns the key of a plain file in the frame index cache, None if the
+    file was modified too recently to be cached safely."""
+    identity = fabioutils.file_identity(os.fstat(infile.fileno()))
+    if identity is None:
+        return None
+    return (os.path.abspath(infile.name),) + identity
+
 
 class MalformedHeaderError(IOError):
     """Raised when a header is malformed"""
@@ -138,6 +304,12 @@ class EdfFrame(fabioimage.FabioFrame):
     """
     A class representing a single frame in an EDF file
     """
+
+    __slots__ = ("_data_compression", "_data_swap_needed", "_data", "start",
+                 "blobsize", "size", "file", "_mapped", "incomplete_data",
+                 "mean", "stddev", "maxval", "minval", "roi", "slice",
+                 "area_sum")
+
     def __init__(self, data=None, header=None, number=None):
         header = EdfImage.check_header(header)
         super(EdfFrame, self).__init__(data, header=header)
@@ -154,6 +326,8 @@ class EdfFrame(fabioimage.FabioFrame):
         self.file = None
         """Opened file object with locking capabilities"""
         self._dtype = None
+        self._mapped = False
+        """True if the data is a view on the memory mapped file"""
         self.incomplete_data = False
 
         if number is not None:
@@ -176,17 +350,16 @@ class EdfFrame(fabioimage.FabioFrame):
             capsHeader={}
             for key in header:
                capsHeader[key.upper()] = key
-        rank=0
-        if capsHeader is not None:
-            rank=0
-            for key in capsHeader:
-                if key[0:4]=="DIM_":
-                    try:
-                        index=int(key[4:])
-                    except ValueError:
-                        logger.error("Unable converting index of {} to integer.".format(key))
-                    if index>rank:
-                        rank=index
+        rank = 0
+        for key in capsHeader:
+            if key.startswith("DIM_"):
+                try:
+                    index = int(key[4:])
+                except ValueError:
+                    logger.error("Unable converting index of {} to integer.".format(key))
+                    continue
+                if index > rank:
+                    rank = index
         return(rank)
 
     @staticmethod
@@ -222,9 +395,9 @@ class EdfFrame(fabioimage.FabioFrame):
             capsHeader={}
             for key in header:
                capsHeader[key.upper()] = key
-        shape=[]
-        for irank in range(1,rank+1):
-            strDim = "DIM_{:d}".format(irank)
+        shape = []
+        for irank in range(1, rank + 1):
+            strDim = "DIM_%d" % irank
             if strDim in capsHeader:
                 try:
                     dimi = nice_int(header[capsHeader[strDim]])
@@ -235,9 +408,9 @@ class EdfFrame(fabioimage.FabioFrame):
                     dimi=0
                 else:
                     dimi=1
-            shape.insert(0,dimi)
+            shape.append(dimi)
 
-        return(tuple(shape))
+        return(tuple(reversed(shape)))
     # JON: this appears to be for nD images, but we don't treat those
     # PB38k20190607: if needed, it could be checked with get_data_rank(shape)<3
 
@@ -251,9 +424,9 @@ class EdfFrame(fabioimage.FabioFrame):
         '''
         if shape is None:
           shape=()
-        counts=1
-        for ishape in range(0,len(shape)):
-            counts*=shape[ishape]
+        counts = 1
+        for dim in shape:
+            counts *= dim
         return(counts)
 
     def _compute_capsheader(self):
@@ -307,18 +480,13 @@ class EdfFrame(fabioimage.FabioFrame):
 
         if self._dtype is None:
             if "DATATYPE" in capsHeader:
-                bytecode = DATA_TYPES[self.header[capsHeader['DATATYPE']]]
+                self._dtype = DATA_TYPES_DTYPE[self.header[capsHeader['DATATYPE']]]
             else:
-                bytecode = numpy.uint16
                 logger.warning("Defaulting type to uint16")
-            self._dtype = numpy.dtype(bytecode)
+                self._dtype = numpy.dtype(numpy.uint16)
 
         if "COMPRESSION" in capsHeader:
-            self._data_compression = self.header[capsHeader["COMPRESSION"]].upper()
-            if self._data_compression == "NONE":
-                self._data_compression = None
-            elif self._data_compression.startswith("NO"):
-                self._data_compression = None
+            self._data_compression = _normalize_compression(self.header[capsHeader["COMPRESSION"]])
         else:
             self._data_compression = None
 
@@ -401,35 +569,34 @@ class EdfFrame(fabioimage.FabioFrame):
         :return: dict capsHeader
         """
         # reset values
-        self.header = OrderedDict()
+        self.header = header = OrderedDict()
         capsHeader = {}
 
-        # Why would someone put null bytes in a header?
-        whitespace = string.whitespace + "\x00"
-
         # Start with the keys of the input header_block
         for line in header_block.split(';'):
-            if '=' in line:
-                key, val = line.split('=', 1)
-                key = key.strip(whitespace)
-                self.header[key] = val.strip(whitespace)
+            key, sep, val = line.partition('=')
+            if sep:
+                key = key.strip(_HEADER_WHITESPACE)
+                if key not in header:
+                    capsHeader[key.upper()] = key
+                header[key] = val.strip(_HEADER_WHITESPACE)
 
         # In a second step copy all missing keys from the general header
         # PB38k20190607: to be done in a later version
 
-        for key in self.header:
-            capsHeader[key.upper()] = key
-
         return capsHeader
 
-    def _check_header_mandatory_keys(self, filename=''):
+    def _check_header_mandatory_keys(self, filename='', capsHeader=None):
         """Check that frame header contains all mandatory keys
 
         :param str filename: Name of the EDF file
+        :param dict capsHeader: Precached mapping from capitalized keys of the
+            header to the original keys.
         :rtype: bool
         """
-        capsKeys = set([k.upper() for k in self.header.keys()])
-        missing = list(MINIMUM_KEYS - capsKeys)
+        if capsHeader is None:
+            capsHeader = self._compute_capsheader()
+        missing = [key for key in MINIMUM_KEYS if key not in capsHeader]
         if len(missing) > 0:
             msg = "EDF file %s%s misses mandatory keys: %s "
             if self.index is not None:
@@ -460,48 +627,62 @@ class EdfFrame(fabioimage.FabioFrame):
             if self._dtype is None:
                 assert(False)
             shape = self.shape
-            with self.file.lock:
-                if self.file.closed:
-                    logger.error("file: %s from %s is closed. Cannot read data." % (self.file, self.file.filename))
-                    return
-                else:
-                    self.file.seek(self.start)
-                    try:
-                        fileData = self.file.read(self.blobsize)
-                    except Exception as e:
-                        if isinstance(self.file, fabioutils.GzipFile):
-                            if compression_module.is_incomplete_gz_block_exception(e):
-                                return numpy.zeros(shape)
-                        raise e
+            fileData = None
+            if self._data_compression is None:
+                data = self._map_data(shape)
+                if data is not None:
+                    self._data = data
+                    self._dtype = None
+                    return data
+            else:
+                # the decompressors read directly from the mapped file
+                fileData = self._map_blob()
+            if fileData is None:
+                with self.file.lock:
+                    if self.file.closed:
+                        logger.error("file: %s from %s is closed. Cannot read data." % (self.file, self.file.filename))
+                        return
+                    else:
+                        self.file.seek(self.start)
+                        try:
+                            if self._data_compression is None:
+                                # read into a writable buffer which can be used
+                                # directly as the array storage
+                                fileData = bytearray(self.blobsize)
+                                del fileData[self.file.readinto(fileData):]
+                            else:
+                                fileData = self.file.read(self.blobsize)
+                        except Exception as e:
+                            if isinstance(self.file, fabioutils.GzipFile):
+                                if compression_module.is_incomplete_gz_block_exception(e):
+                                    return numpy.zeros(shape)
+                            raise e
 
             if self._data_compression is not None:
                 compression = self._data_compression
-                uncompressed_size = self._dtype.itemsize
-                for i in shape:
-                    uncompressed_size *= i
-                if "OFFSET" in compression:
-                    try:
-                        import byte_offset  # IGNORE:F0401
-                    except ImportError as error:
-                        logger.error("Unimplemented compression scheme:  %s (%s)" % (compression, error))
-                    else:
-                        myData = byte_offset.analyseCython(fileData, size=uncompressed_size)
-                        rawData = myData.astype(self._dtype).tostring()
-                        self.size = uncompressed_size
-                elif compression == "NONE":
-                    rawData = fileData
-                elif "GZIP" in compression:
-                    rawData = decGzip(fileData)
-                    self.size = uncompressed_size
-                elif "BZ" in compression:
-                    rawData = decBzip2(fileData)
-                    self.size = uncompressed_size
-                elif "Z" in compression:
-                    rawData = decZlib(fileData)
+                count = self.get_data_counts(shape)
+                uncompressed_size = count * self._dtype.itemsize
+                if compression == "OFFSET":
+                    # decode straight into the final array, values are native
+                    data = numpy.empty(count, dtype=self._dtype.newbyteorder("="))
+                    dtype = "int32" if self._dtype.itemsize <= 4 else "int64"
+                    decoded = compression_module.decByteOffset(fileData, count, dtype=dtype, out=data)
+                    if decoded.size < count:
+                        logger.error("Data stream is incomplete: %s < expected %s values" % (decoded.size, count))
+                        data[decoded.size:] = 0
                     self.size = uncompressed_size
+                    data = data.reshape(shape)
+                    self._data = data
+                    self._dtype = None
+                    return data
                 else:
-                    logger.warning("Unknown compression scheme %s" % compression)
-                    rawData = fileData
+                    decoder = _COMPRESSION_DECODERS.get(compression)
+                    if decoder is None:
+                        logger.warning("Unknown compression scheme %s" % compression)
+                        rawData = fileData
+                    else:
+                        rawData = decoder(fileData)
+                        self.size = uncompressed_size
             else:
                 rawData = fileData
 
@@ -509,19 +690,94 @@ class EdfFrame(fabioimage.FabioFrame):
             obtained = len(rawData)
             if expected > obtained:
                 logger.error("Data stream is incomplete: %s < expected %s bytes" % (obtained, expected))
-                rawData += b"\x00" * (expected - obtained)
+                if not isinstance(rawData, bytearray):
+                    rawData = bytearray(rawData)
+                rawData.extend(b"\x00" * (expected - obtained))
             elif expected < obtained:
+                # the padding is skipped by the count given to frombuffer
                 logger.info("Data stream is padded : %s > required %s bytes" % (obtained, expected))
-                rawData = rawData[:expected]
             # PB38k20190607: explicit way: count = get_data_counts(shape)
             count = self.size // self._dtype.itemsize
-            data = numpy.frombuffer(rawData, self._dtype, count).copy().reshape(shape)
-            if self.swap_needed():
-                data.byteswap(True)
+            if isinstance(rawData, bytearray):
+                data = numpy.frombuffer(rawData, self._dtype, count)
+                if self.swap_needed():
+                    data.byteswap(True)
+            elif self.swap_needed():
+                # arrays built on bytes are read-only: swap while copying
+                data = numpy.frombuffer(rawData, self._dtype.newbyteorder(), count).astype(self._dtype)
+            else:
+                data = numpy.frombuffer(rawData, self._dtype, count).copy()
+            data = data.reshape(shape)
             self._data = data
             self._dtype = None
         return data
 
+    def _get_file_mapping(self):
+        """
+        Returns a copy-on-write memory map of the whole file, shared by all
+        the frames read from the same file object. The `_mmap` attribute of
+        the file object caches it, False meaning not to map the file.
+
+        :return: mmap.mmap or None if the file can not be mapped
+        """
+        infile = self.file
+        if not isinstance(infile, fabioutils.File) or isinstance(infile, fabioutils.UnknownCompressedFile):
+            return None
+        mapped = getattr(infile, "_mmap", None)
+        if mapped is None:
+            with infile.lock:
+                mapped = getattr(infile, "_mmap", None)
+                if mapped is None:
+                    try:
+                        mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_COPY)
+                    except (ValueError, EnvironmentError) as error:
+                        logger.debug("Unable to map %s: %s", infile.name, error)
+                        mapped = False
+                    infile._mmap = mapped
+        return mapped or None
+
+    def _map_blob(self):
+        """
+        Returns the raw blob of this frame as a view on the memory mapped
+        file, without any read or copy.
+
+        :return: memoryview or None if the blob can not be mapped
+        """
+        if self.file.closed:
+            return None
+        mapped = self._get_file_mapping()
+        if mapped is None or self.start + self.blobsize > len(mapped):
+            return None
+        return memoryview(mapped)[self.start:self.start + self.blobsize]
+
+    def _map_data(self, shape):
+        """
+        Build the dataset from the memory mapped file.
+
+        The data are copied out of the map, in a single pass which also swaps
+        data with a foreign byte order. Only if the file was opened with
+        `copy=False`, data in the native byte order are returned as a view on
+        the map, without any copy: changing the array does not change the
+        file, but the parts of the array which were not changed follow the
+        changes made to the file.
+
+        :return: numpy.ndarray or None if the data can not be mapped
+        """
+        if self.file.closed:
+            return None
+        mapped = self._get_file_mapping()
+        if mapped is None or self.start + self.size > len(mapped):
+            return None
+        count = self.size // self._dtype.itemsize
+        if self.swap_needed():
+            data = numpy.frombuffer(mapped, self._dtype.newbyteorder(), count, offset=self.start)
+            return data.astype(self._dtype).reshape(shape)
+        data = numpy.frombuffer(mapped, self._dtype, count, offset=self.start).reshape(shape)
+        if getattr(self.file, "_mmap_copy", True):
+            return data.copy()
+        self._mapped = True
+        return data
+
     @property
     def data(self):
         """
@@ -535,6 +791,7 @@ class EdfFrame(fabioimage.FabioFrame):
     def data(self, value):
         """Setter for data in edf frame"""
         self._data = value
+        self._mapped = False
 
     @deprecation.deprecated(reason="Prefer using 'frame.data'", deprecated_since="0.10.0beta")
     def getData(self):
@@ -549,6 +806,7 @@ class EdfFrame(fabioimage.FabioFrame):
     def setData(self, npa=None):
         """Setter for data in edf frame"""
         self._data = npa
+        self._mapped = False
 
     def get_edf_block(self, force_type=None, fit2dMode=False):
         """
@@ -558,6 +816,45 @@ class EdfFrame(fabioimage.FabioFrame):
         :return: ascii header block + binary data block
         :rtype: python bytes with the concatenation of the ascii header and the binary data block
         """
+        header, data = self._get_edf_block_parts(force_type, fit2dMode)
+        return header + data.tobytes()
+
+    def write_edf_block(self, outfile, force_type=None, fit2dMode=False):
+        """
+        Write the EDF block of this frame to a file, without building the
+        concatenation of the header and the data in memory.
+
+        Prefer it to `get_edf_block` when saving large frames: the data are
+        written directly from the buffer of the array.
+
+        :param outfile: file object opened for writing (plain, gzip or bz2)
+        :param force_type: type of the dataset to be enforced like "float64" or "uint16"
+        :type force_type: string or numpy.dtype
+        :param boolean fit2dMode: enforce compatibility with fit2d and starts counting number of images at 1
+        """
+        header, data = self._get_edf_block_parts(force_type, fit2dMode)
+        self._write_edf_block_parts(outfile, header, data)
+
+    @staticmethod
+    def _write_edf_block_parts(outfile, header, data):
+        """Write the header bytes and the dataset returned by
+        `_get_edf_block_parts` to a file"""
+        data = numpy.ascontiguousarray(data)
+        if hasattr(os, "writev") and isinstance(outfile, fabioutils.File):
+            # unbuffered plain file: a single system call for the whole block
+            _writev(outfile.fileno(), [header, data.reshape(-1).view(numpy.uint8)])
+        else:
+            outfile.write(header)
+            # file objects accept the buffer of the array: no intermediate bytes
+            outfile.write(data)
+
+    def _get_edf_block_parts(self, force_type=None, fit2dMode=False):
+        """
+        :param force_type: type of the dataset to be enforced like "float64" or "uint16"
+        :param boolean fit2dMode: enforce compatibility with fit2d and starts counting number of images at 1
+        :return: the ascii header block as bytes and the dataset to write
+        :rtype: tuple(bytes, numpy.ndarray)
+        """
         if force_type is not None:
             data = self.data.astype(force_type)
         else:
@@ -565,65 +862,69 @@ class EdfFrame(fabioimage.FabioFrame):
         fit2dMode = bool(fit2dMode)
 
         # Compute map from normalized upper key to original key in the header
-        capsHeader = {}
-        for key in self.header:
-            upperkey = key.upper()
-            if upperkey not in capsHeader:
-                capsHeader[upperkey] = key
+        capsHeader = self._compute_capsheader()
 
-        header = self.header.copy()
-        header_keys = list(self.header.keys())
+        # Values of the regenerated keys, all others come from self.header
+        overrides = {}
 
         listHeader = ["{\n"]
         # First of all clean up the headers:
+        removed = set()
         for i in capsHeader:
             if "DIM_" in i:
-                header.pop(capsHeader[i])
-                header_keys.remove(capsHeader[i])
+                removed.add(capsHeader[i])
         for KEY in ["SIZE", "EDF_BINARYSIZE", "EDF_HEADERSIZE", "BYTEORDER", "DATATYPE", "HEADERID", "IMAGE"]:
             if KEY in capsHeader:
-                header.pop(capsHeader[KEY])
-                header_keys.remove(capsHeader[KEY])
+                removed.add(capsHeader[KEY])
         if "EDF_DATABLOCKID" in capsHeader:
-            header_keys.remove(capsHeader["EDF_DATABLOCKID"])
-            # but do not remove the value from dict, instead reset the key ...
-            if capsHeader["EDF_DATABLOCKID"] != "EDF_DataBlockID":
-                header["EDF_DataBlockID"] = header.pop(capsHeader["EDF_DATABLOCKID"])
-                capsHeader["EDF_DATABLOCKID"] = "EDF_DataBlockID"
+            removed.add(capsHeader["EDF_DATABLOCKID"])
+            # but do not drop the value, instead reset the key ...
+            overrides["EDF_DataBlockID"] = self.header[capsHeader["EDF_DATABLOCKID"]]
+        header_keys = deque(key for key in self.header if key not in removed)
 
         # Then update static headers freshly deleted
-        header_keys.insert(0, "Size")
-        header["Size"] = data.nbytes
-        header_keys.insert(0, "HeaderID")
-        header["HeaderID"] = "EH:%06d:000000:000000" % (self.index + fit2dMode)
-        header_keys.insert(0, "Image")
-        header["Image"] = str(self.index + fit2dMode)
+        header_keys.appendleft("Size")
+        overrides["Size"] = data.nbytes
+        header_keys.appendleft("HeaderID")
+        overrides["HeaderID"] = "EH:%06d:000000:000000" % (self.index + fit2dMode)
+        header_keys.appendleft("Image")
+        overrides["Image"] = str(self.index + fit2dMode)
 
         dims = list(data.shape)
         nbdim = len(dims)
         for i in dims:
             key = "Dim_%i" % nbdim
-            header[key] = i
-            header_keys.insert(0, key)
+            overrides[key] = i
+            header_keys.appendleft(key)
             nbdim -= 1
-        header_keys.insert(0, "DataType")
-        header["DataType"] = NUMPY_EDF_DTYPE[str(numpy.dtype(data.dtype))]
-        header_keys.insert(0, "ByteOrder")
+        header_keys.appendleft("DataType")
+        dtype_name = _EDF_DTYPE_NAMES.get(data.dtype)
+        if dtype_name is None:
+            dtype_name = NUMPY_EDF_DTYPE[str(data.dtype)]
+        overrides["DataType"] = dtype_name
+        header_keys.appendleft("ByteOrder")
         if numpy.little_endian:
-            header["ByteOrder"] = "LowByteFirst"
+            overrides["ByteOrder"] = "LowByteFirst"
         else:
-            header["ByteOrder"] = "HighByteFirst"
+            overrides["ByteOrder"] = "HighByteFirst"
+        # string values are computed once, for the estimate and the output
+        strValues = {}
         approxHeaderSize = 100
-        for key in header:
-            approxHeaderSize += 7 + len(key) + len(str(header[key]))
+        for key, value in self.header.items():
+            if key not in removed and key not in overrides:
+                strValue = strValues[key] = str(value)
+                approxHeaderSize += 7 + len(key) + len(strValue)
+        for key, value in overrides.items():
+            strValue = strValues[key] = str(value)
+            approxHeaderSize += 7 + len(key) + len(strValue)
         approxHeaderSize = BLOCKSIZE * (approxHeaderSize // BLOCKSIZE + 1)
-        header_keys.insert(0, "EDF_HeaderSize")
-        header["EDF_HeaderSize"] = "%5s" % (approxHeaderSize)
-        header_keys.insert(0, "EDF_BinarySize")
-        header["EDF_BinarySize"] = data.nbytes
-        header_keys.insert(0, "EDF_DataBlockID")
-        if "EDF_DataBlockID" not in header:
-            header["EDF_DataBlockID"] = "%i.Image.Psd" % (self.index + fit2dMode)
+        header_keys.appendleft("EDF_HeaderSize")
+        strValues["EDF_HeaderSize"] = "%5s" % (approxHeaderSize)
+        header_keys.appendleft("EDF_BinarySize")
+        strValues["EDF_BinarySize"] = str(data.nbytes)
+        header_keys.appendleft("EDF_DataBlockID")
+        if "EDF_DataBlockID" not in overrides:
+            strValues["EDF_DataBlockID"] = "%i.Image.Psd" % (self.index + fit2dMode)
         preciseSize = 4  # 2 before {\n 2 after }\n
         for key in header_keys:
             # Escape keys or values that are no ascii
@@ -631,7 +932,7 @@ class EdfFrame(fabioimage.FabioFrame):
             if not isAscii(strKey, listExcluded=["}", "{"]):
                 logger.warning("Non ascii key %s, skipping" % strKey)
                 continue
-            strValue = str(header[key])
+            strValue = strValues[key]
             if not isAscii(strValue, listExcluded=["}", "{"]):
                 logger.warning("Non ascii value %s, skipping" % strValue)
                 continue
@@ -654,7 +955,7 @@ class EdfFrame(fabioimage.FabioFrame):
         else:
             headerSize = approxHeaderSize
         listHeader.append(" " * (headerSize - preciseSize) + "}\n")
-        return ("".join(listHeader)).encode("ASCII") + data.tostring()
+        return ("".join(listHeader)).encode("ASCII"), data
 
     @deprecation.deprecated(reason="Prefer using 'getEdfBlock'", deprecated_since="0.10.0beta")
     def getEdfBlock(self, force_type=None, fit2dMode=False):
@@ -677,6 +978,12 @@ class EdfImage(fabioimage.FabioImage):
     RESERVED_HEADER_KEYS = ['HEADERID', 'IMAGE', 'BYTEORDER', 'DATATYPE',
                             'DIM_1', 'DIM_2', 'DIM_3', 'SIZE']
 
+    USE_MMAP = False
+    """Read the frames of plain files through a memory map of the file.
+
+    The map is kept while the file is open: if the file is truncated in
+    the meantime, reading a frame crashes the interpreter."""
+
     def __init__(self, data=None, header=None, frames=None):
         self.currentframe = 0
         self.filesize = None
@@ -730,7 +1037,11 @@ class EdfImage(fabioimage.FabioImage):
             return OrderedDict()
         new = OrderedDict()
         for key, value in header.items():
-            new[toAscii(key, ";{}")] = toAscii(value, ";{}")
+            if not isinstance(key, str) or _UNSAFE_HEADER_CHARS.search(key):
+                key = toAscii(key, ";{}")
+            if not isinstance(value, str) or _UNSAFE_HEADER_CHARS.search(value):
+                value = toAscii(value, ";{}")
+            new[key] = value
         return new
 
     @staticmethod
@@ -759,8 +1070,15 @@ class EdfImage(fabioimage.FabioImage):
         binary_size=None
 
         MAX_HEADER_SIZE = BLOCKSIZE * MAX_BLOCKS
+        plain_file = isinstance(infile, fabioutils.File)
+        if plain_file:
+            # Seeking back is cheap on plain files: fetch the largest header
+            # in one read instead of one read per block
+            first_read = MAX_HEADER_SIZE
+        else:
+            first_read = BLOCKSIZE
         try:
-            block = infile.read(BLOCKSIZE)
+            block = infile.read(first_read)
         except Exception as e:
             if isinstance(infile, fabioutils.GzipFile):
                 if compression_module.is_incomplete_gz_block_exception(e):
@@ -771,7 +1089,7 @@ class EdfImage(fabioimage.FabioImage):
             # end of file
             return HeaderBlockType(None,None,None)
 
-        begin_block = block.find(b"{")
+        begin_block = block.find(b"{", 0, BLOCKSIZE)
         if begin_block < 0:
             if len(block) < BLOCKSIZE and len(block.strip()) == 0:
                 # Empty block looks to be a valid end of file
@@ -793,90 +1111,65 @@ class EdfImage(fabioimage.FabioImage):
 
         # PB38k20190607: place for reading other EDF_ keys, will be included later
 
-        start = block.find(b"EDF_HeaderSize", begin_block)
+        start = block.find(_EDF_HEADERSIZE_TAG, begin_block, BLOCKSIZE)
         if start >= 0:
-            equal = block.index(b"=", start + len(b"EDF_HeaderSize"))
-            end = block.index(b";", equal + 1)
-            try:
-                chunk = block[equal + 1:end].strip()
-                new_max_header_size = int(chunk)
-            except Exception:
-                logger.warning("Unable to read header size, got: %s", chunk)
+            match = _EDF_HEADERSIZE_VALUE.match(block, start + len(_EDF_HEADERSIZE_TAG))
+            if match is None:
+                logger.warning("Unable to read header size, got: %s", block[start:start + 64])
             else:
+                new_max_header_size = int(match.group(1))
                 if new_max_header_size > MAX_HEADER_SIZE:
                     logger.info("Redefining MAX_HEADER_SIZE to %s", new_max_header_size)
                     MAX_HEADER_SIZE = new_max_header_size
 
-        block_size = len(block)
-        blocks = [block]
+        # Blocks are accumulated in a single growing buffer
+        buf = bytearray(block)
 
         # The edf header MUST stop with "\n" after a closing
         # curly brace { and never directly after "\r".
         #
         # A single \r is allowed as fill character, i.e. \r{0,1}:
-        #   end_pattern = re.compile(b'}(\r{0,1})\n')
+        #   b'}\r?\n', located by _find_header_end
         #
         # Different to the original expression b'}[\r\n]' this
         # one matches only "}\r\n" and "}\n", but not "}\r" alone.
         # start_blob, end_block and offset can be calculated
         # directly after a succesful search.
         #
-        # The maximum length of the header end pattern is 3 bytes,
-        # Additional checks are needed for locating header end
-        # patterns that are distributed across two blocks.
-
-        end_pattern = re.compile(b'}(\r{0,1})\n')
+        # The maximum length of the header end pattern is 3 bytes:
+        # after each read, the pattern is first looked for across the
+        # boundary with the previous block.
+
+        end = _find_header_end(buf)
+        while end is None:
+            previous_size = len(buf)
+            if plain_file:
+                # EDF_HeaderSize raised MAX_HEADER_SIZE: read up to it at once
+                nextblock = infile.read(max(BLOCKSIZE, MAX_HEADER_SIZE - previous_size))
+            else:
+                nextblock = infile.read(BLOCKSIZE)
+            buf += nextblock
 
-        while True:
-            end = end_pattern.search(block)
-            if end is not None:
-                end_block = block_size - len(block) + end.start()
-                start_blob = block_size - len(block) + end.end()
-                offset = start_blob - block_size
+            end = _find_header_end(buf, max(0, previous_size - 2), previous_size + 2)
+            if end is not None and end[0] < previous_size:
+                # end pattern distributed across two blocks
+                header_size = previous_size
                 break
 
-            # PB38k20190607: Searching the end_pattern in the whole block
-            # intends that it could be located anywhere. However, for some files
-            # the end_pattern search fails, if the end_pattern is distributed
-            # across two blocks. The next tests check whether '}' or '}\r' is
-            # located at the end of the first block and the remaining pattern
-            # at the start of the next block.
-            nextblock = infile.read(BLOCKSIZE)
-
-            if block[-1:] == b'}':
-                if nextblock[:1] == b'\n':
-                    end_block = block_size
-                    start_blob = block_size + 1
-                    offset = start_blob - block_size - len(nextblock)
-                    break
-                elif nextblock[:2] == b'\r\n':
-                    end_block = block_size
-                    start_blob = block_size + 2
-                    offset = start_blob - block_size - len(nextblock)
-                    break
-            elif block[-2:] == b'}\r':
-                if nextblock[:1] == b'\n':
-                    end_block = block_size - 1
-                    start_blob = block_size + 1
-                    offset = start_blob - block_size - len(nextblock)
-                    break
-
-            block = nextblock
-
-            block_size += len(block)
-            blocks.append(block)
-            if len(block) == 0 or block_size > MAX_HEADER_SIZE:
-                block = b"".join(blocks)
-                logger.debug("Runaway header in EDF file MAX_HEADER_SIZE: %s\n%s", MAX_HEADER_SIZE, block)
+            if len(nextblock) == 0 or len(buf) > MAX_HEADER_SIZE:
+                logger.debug("Runaway header in EDF file MAX_HEADER_SIZE: %s\n%s", MAX_HEADER_SIZE, bytes(buf))
                 raise MalformedHeaderError("Runaway header frame %i (max size: %i)" % (frame_id, MAX_HEADER_SIZE))
+            end = _find_header_end(buf, previous_size)
 
-        block = b"".join(blocks)
+        end_block, start_blob = end
+        block_size = len(buf)
+        offset = start_blob - block_size
 
         # Go to the start of the binary blob
         infile.seek(offset, os.SEEK_CUR)
 
         # PB38k20190607: return the header_block, header_size, binary_size as a named tuple
-        header_block = block[begin_block:end_block].decode("ASCII")
+        header_block = buf[begin_block:end_block].decode("ASCII")
 
         if header_size is None:
             header_size = block_size
@@ -898,6 +1191,24 @@ class EdfImage(fabioimage.FabioImage):
         :type infile: file object open in read mode
         """
         self._frames = []
+        check_keys = logger.isEnabledFor(logging.INFO)
+        cache_key = None
+        if isinstance(infile, fabioutils.File):
+            # Plain file: the presence of each blob is checked against the
+            # size of the file instead of reading its last byte
+            file_size = os.fstat(infile.fileno()).st_size
+            if _FRAME_INDEX_CACHE_SIZE > 0:
+                cache_key = _frame_index_key(infile)
+            if cache_key is not None:
+                with _FRAME_INDEX_LOCK:
+                    index = _FRAME_INDEX_CACHE.pop(cache_key, None)
+                    if index is not None:
+                        _FRAME_INDEX_CACHE[cache_key] = index
+                if index is not None:
+                    self._restore_frame_index(infile, index)
+                    return
+        else:
+            file_size = None
 
         while True:
             try:
@@ -924,28 +1235,33 @@ class EdfImage(fabioimage.FabioImage):
 
             capsHeader = frame._create_header(value.header_block)
 
-            # get frame.blobsize
-            if value.binary_size is None:
-                if "SIZE" in capsHeader:
-                    try:
-                        frame.blobsize = nice_int(frame.header[capsHeader["SIZE"]])
-                    except ValueError:
-                        logger.warning("Unable to convert to integer : %s %s " % (capsHeader["SIZE"], frame.header[capsHeader["SIZE"]]))
-            else:
-                frame.blobsize = value.binary_size
-
             frame.start = infile.tell()
 
             # PB38k20190607: currently, there are no additional header
             # values to be included from a general header. capsHeader is therefore
             # complete for checking and extracting metadata.
+            # frame.blobsize is read from the "Size" key there
             frame._extract_header_metadata(capsHeader)
+            if value.binary_size is not None:
+                frame.blobsize = value.binary_size
 
             # PB38k20190607: add a standard frame
-            self._frames += [frame]
+            self._frames.append(frame)
 
             # PB38k20190607: Check the information of the complete header
-            frame._check_header_mandatory_keys(filename=self.filename)
+            # The result is only reported in the log
+            if check_keys:
+                frame._check_header_mandatory_keys(filename=self.filename, capsHeader=capsHeader)
+
+            if file_size is not None:
+                if frame.start + frame.blobsize > file_size:
+                    self._incomplete_file = True
+                    frame.incomplete_data = True
+                    # Out of the file
+                    break
+                # skip the data block
+                infile.seek(frame.blobsize, os.SEEK_CUR)
+                continue
 
             try:
                 # skip the data block
@@ -972,15 +1288,64 @@ class EdfImage(fabioimage.FabioImage):
         # done for each frame in the above loop
         self.currentframe = 0
 
-    def read(self, fname, frame=None):
+        if cache_key is not None:
+            index = self._incomplete_file, tuple(
+                _FrameIndexEntry(frame.header.copy(), frame.start, frame.blobsize,
+                                 frame.size, frame._shape, frame._dtype,
+                                 frame._data_compression, frame._data_swap_needed,
+                                 frame.incomplete_data)
+                for frame in self._frames)
+            with _FRAME_INDEX_LOCK:
+                _FRAME_INDEX_CACHE[cache_key] = index
+                while len(_FRAME_INDEX_CACHE) > _FRAME_INDEX_CACHE_SIZE:
+                    _FRAME_INDEX_CACHE.popitem(last=False)
+
+    def _restore_frame_index(self, infile, index):
+        """Populate the frames from a cached frame index, without parsing
+        the headers again.
+
+        :param infile: file object open in read mode
+        :param index: the incomplete_file flag and a _FrameIndexEntry per frame
+        """
+        self._incomplete_file, entries = index
+        for entry in entries:
+            frame = EdfFrame()
+            frame.file = infile
+            frame._index = len(self._frames)
+            frame.header = entry.header.copy()
+            frame.start = entry.start
+            frame.blobsize = entry.blobsize
+            frame.size = entry.size
+            frame._shape = entry.shape
+            frame._dtype = entry.dtype
+            frame._data_compression = entry.compression
+            frame._data_swap_needed = entry.swap_needed
+            frame.incomplete_data = entry.incomplete_data
+            self._frames.append(frame)
+        self.currentframe = 0
+
+    def read(self, fname, frame=None, use_mmap=None, copy=True):
         """
         Read in header into self.header and
             the data   into self.data
+
+        :param use_mmap: read the data through a memory map of the file,
+            defaults to USE_MMAP
+        :param bool copy: if False, the data of the uncompressed frames read
+            through the memory map are views on it. They avoid a copy but
+            follow the changes later made to the file, and accessing them
+            after the file was truncated crashes the interpreter.
         """
         self.resetvals()
         self.filename = fname
 
         infile = self._open(fname, "rb")
+        if not (self.USE_MMAP if use_mmap is None else use_mmap):
+            infile._mmap = False
+        infile._mmap_copy = copy
+        if not hasattr(infile, "lock"):
+            # plain streams are shared by the lazy frames like fabio files
+            infile.lock = fabioutils._Semaphore()
         try:
             self._readheader(infile)
             if frame is None:
@@ -1011,6 +1376,27 @@ class EdfImage(fabioimage.FabioImage):
         """
         return self._frames[self.currentframe].getData()
 
+    def read_all_data(self, workers=None):
+        """
+        Unpack the data of all frames at once.
+
+        The raw blobs are read one at a time but the decompression, which
+        releases the GIL, runs in a pool of threads.
+
+        :param int workers: number of threads, the default of the executor if None
+        :return: list of the datasets of all frames as numpy.ndarray
+        """
+        frames = self._frames
+        pending = [frame for frame in frames if frame._data is None and frame.file is not None]
+        if ThreadPoolExecutor is None or workers == 1 or len(pending) < 2:
+            for frame in pending:
+                frame._unpack()
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # consume the results to propagate exceptions
+                list(executor.map(EdfFrame._unpack, pending))
+        return [frame.data for frame in frames]
+
     def getframe(self, num):
         """ returns the file numbered 'num' in the series as a FabioImage """
         newImage = None
@@ -1019,11 +1405,13 @@ class EdfImage(fabioimage.FabioImage):
             newImage = fabioimage.FabioImage.getframe(self, num)
             newImage._file = self._file
         elif num < self.nframes:
-            logger.debug("Multi frame EDF; having EdfImage specific behavior: %s/%s" % (num, self.nframes))
-            newImage = self.__class__(frames=self._frames)
+            logger.debug("Multi frame EDF; having EdfImage specific behavior: %s/%s", num, self.nframes)
+            # A shallow copy sharing the frames: running __init__ would build
+            # and throw away an empty frame at each call
+            newImage = self.__class__.__new__(self.__class__)
+            newImage.__dict__.update(self.__dict__)
             newImage.currentframe = num
-            newImage.filename = self.filename
-            newImage._file = self._file
+            newImage.resetvals()
         else:
             raise IOError("EdfImage.getframe: Cannot access frame: %s/%s" %
                           (num, self.nframes))
@@ -1060,14 +1448,117 @@ class EdfImage(fabioimage.FabioImage):
 
         :param force_type: can be numpy.uint16 or simply "float"
         """
+        if fname == self.filename and self._replace_file(fname, force_type, fit2dMode):
+            return
         # correct for bug #27: read all data before opening the file in write mode
         if fname == self.filename:
             [(frame.header, frame.data) for frame in self._frames]
             # this is thrown away
+            # mapped data would vanish with the file truncation
+            for frame in self._frames:
+                if frame._mapped:
+                    frame._data = frame._data.copy()
+                    frame._mapped = False
+            self._close_mapping()
         with self._open(fname, mode="wb") as outfile:
-            for i, frame in enumerate(self._frames):
-                frame._set_container(self, i)
-                outfile.write(frame.get_edf_block(force_type=force_type, fit2dMode=fit2dMode))
+            self._write_frames(outfile, force_type, fit2dMode)
+
+    def _write_frames(self, outfile, force_type, fit2dMode):
+        """Write the EDF blocks of all the frames to a file.
+
+        The blocks of the next frames, which may need decompressing or
+        converting the data, are prepared by a pool of threads while the
+        current one is written.
+        """
+        frames = self._frames
+        for i, frame in enumerate(frames):
+            frame._set_container(self, i)
+        if ThreadPoolExecutor is None or len(frames) < 2:
+            for frame in frames:
+                frame.write_edf_block(outfile, force_type=force_type, fit2dMode=fit2dMode)
+            return
+        workers = min(4, len(frames))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # bounded number of blocks in memory
+            pending = deque()
+            for frame in frames:
+                pending.append(executor.submit(frame._get_edf_block_parts, force_type, fit2dMode))
+                if len(pending) > workers:
+                    EdfFrame._write_edf_block_parts(outfile, *pending.popleft().result())
+            while pending:
+                EdfFrame._write_edf_block_parts(outfile, *pending.popleft().result())
+
+    def _replace_file(self, fname, force_type, fit2dMode):
+        """Rewrite the file the frames are read from.
+
+        The frames are written to a temporary file which then replaces the
+        original one. The frames which are not loaded yet, or mapped, keep
+        reading the original content through the already opened file.
+
+        :return: False if the file can not be replaced this way (not a
+            plain file, file with hard links or extended attributes, owner
+            which can not be kept, directory which is not writable, or a file
+            system where open files can not be replaced)
+        """
+        if os.name != "posix":
+            return False
+        try:
+            file_stat = os.lstat(fname)
+        except OSError:
+            return False
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_nlink > 1:
+            # a new file would not replace symbolic or hard links
+            return False
+        listxattr = getattr(os, "listxattr", None)
+        if listxattr is not None:
+            try:
+                if listxattr(fname):
+                    return False
+            except OSError:
+                pass
+        directory, basename = os.path.split(os.path.abspath(fname))
+        # keep the extension which selects the compression
+        extension = os.path.splitext(basename)[1]
+        try:
+            fd, tmpname = tempfile.mkstemp(suffix=extension, prefix="." + basename, dir=directory)
+        except OSError as error:
+            logger.debug("Unable to create a file next to %s: %s", fname, error)
+            return False
+        os.close(fd)
+        try:
+            tmp_stat = os.stat(tmpname)
+            if (tmp_stat.st_uid, tmp_stat.st_gid) != (file_stat.st_uid, file_stat.st_gid):
+                os.chown(tmpname, file_stat.st_uid, file_stat.st_gid)
+            os.chmod(tmpname, stat.S_IMODE(file_stat.st_mode))
+        except OSError as error:
+            logger.debug("Unable to give %s the owner and mode of %s: %s", tmpname, fname, error)
+            os.unlink(tmpname)
+            return False
+        filenumber = self.filenumber
+        try:
+            with self._open(tmpname, mode="wb") as outfile:
+                self._write_frames(outfile, force_type, fit2dMode)
+            os.rename(tmpname, fname)
+        except Exception:
+            os.unlink(tmpname)
+            raise
+        finally:
+            self.filename = fname
+            self.filenumber = filenumber
+        return True
+
+    def _close_mapping(self):
+        """Release the memory map of the file, if no array is using it"""
+        infile = self._file
+        mapped = getattr(infile, "_mmap", None)
+        if mapped:
+            try:
+                mapped.close()
+            except BufferError:
+                # some arrays still reference it
+                logger.debug("Memory map of %s still in use", self.filename)
+            else:
+                infile._mmap = False
 
     def append_frame(self, frame=None, data=None, header=None):
         """
@@ -1100,44 +1591,124 @@ class EdfImage(fabioimage.FabioImage):
     def deleteFrame(self, frameNb=None):
         self.delete_frame(frameNb)
 
-    def fast_read_data(self, filename=None):
+    def fast_read_data(self, filename=None, copy=True):
         """
         This is a special method that will read and return the data from another file ...
         The aim is performances, ... but only supports uncompressed files.
 
+        :param bool copy: if False and no byte swap is needed, return a
+            read-only view on the file content instead of a copy
         :return: data from another file using positions from current EdfImage
         """
         if (filename is None) or not os.path.isfile(filename):
             raise RuntimeError("EdfImage.fast_read_data is only valid with another file: %s does not exist" % (filename))
         data = None
         frame = self._frames[self.currentframe]
-        with open(filename, "rb")as f:
-            f.seek(frame.start)
-            raw = f.read(frame.blobsize)
+        shape = self.data.shape
+        data = self._memmap_array(filename, frame.start, shape, frame.swap_needed(), copy=copy)
+        if data is not None:
+            return data
+        raw = _pread(filename, frame.start, frame.blobsize)
         try:
-            data = numpy.frombuffer(raw, dtype=self.bytecode).copy()
-            data.shape = self.data.shape
+            data = self._frombuffer(raw, frame.swap_needed(), copy=copy)
+            data.shape = shape
         except Exception as error:
             logger.error("unable to convert file content to numpy array: %s", error)
-        if frame.swap_needed():
-            data.byteswap(True)
         return data
 
+    def _frombuffer(self, raw, swap_needed, copy=True):
+        """Build a writable 1D array of the current data type from raw bytes,
+        swapping the bytes while copying if needed.
+
+        If `copy` is False and no swap is needed, the array is a read-only
+        view on `raw`."""
+        dtype = numpy.dtype(self.bytecode)
+        if swap_needed:
+            return numpy.frombuffer(raw, dtype=dtype.newbyteorder()).astype(dtype)
+        data = numpy.frombuffer(raw, dtype=dtype)
+        return data.copy() if copy else data
+
+    def _memmap_array(self, filename, offset, shape, swap_needed, roi=None, copy=True):
+        """Copy an array of the current data type out of a memory mapped file,
+        swapping the bytes while copying if needed.
+
+        Only the pages covering `roi` (the whole array if None) are read.
+        If `copy` is False and no swap is needed, the read-only mapped array
+        is returned.
+
+        :return: the array, or None if the file can not be mapped (USE_MMAP
+            disabled, file too short...)
+        """
+        if not self.USE_MMAP:
+            return None
+        dtype = numpy.dtype(self.bytecode)
+        try:
+            mapped = numpy.memmap(filename, mode="r", offset=offset, shape=shape,
+                                  dtype=dtype.newbyteorder() if swap_needed else dtype)
+        except (ValueError, EnvironmentError) as error:
+            logger.debug("Unable to map %s: %s", filename, error)
+            return None
+        if roi is not None:
+            mapped = mapped[roi]
+        if not copy and not swap_needed:
+            return mapped
+        return numpy.array(mapped, dtype=dtype)
+
     @deprecation.deprecated(reason="Prefer using 'fastReadData'", deprecated_since="0.10.0beta")
     def fastReadData(self, filename):
         return self.fast_read_data(filename)
 
-    def fast_read_roi(self, filename, coords=None):
+    def fast_read_roi(self, filename, coords=None, copy=True):
         """
         Method reading Region of Interest of another file  based on metadata available in current EdfImage.
         The aim is performances, ... but only supports uncompressed files.
 
+        :param bool copy: if False and no byte swap is needed, return a
+            read-only view on the file content instead of a copy
         :return: ROI-data from another file using positions from current EdfImage
         :rtype: numpy 2darray
         """
         if (filename is None) or not os.path.isfile(filename):
             raise RuntimeError("EdfImage.fast_read_roi is only valid with another file: %s does not exist" % (filename))
-        data = None
+        location = self._roi_location(coords)
+        if location is None:
+            return
+        return self._read_roi(filename, *location, copy=copy)
+
+    def fast_read_roi_batch(self, filenames, coords=None, workers=None, copy=True):
+        """
+        Read the same Region of Interest from many other files, based on
+        metadata available in current EdfImage (see :meth:`fast_read_roi`).
+
+        The files are read concurrently by a pool of threads.
+
+        :param list filenames: names of the files to read
+        :param coords: Region of Interest, as for :meth:`fast_read_roi`
+        :param int workers: number of threads, the default of the executor if None
+        :param bool copy: as for :meth:`fast_read_roi`
+        :return: list of ROI-data, one per file
+        :rtype: list of numpy 2darray
+        """
+        filenames = list(filenames)
+        for filename in filenames:
+            if (filename is None) or not os.path.isfile(filename):
+                raise RuntimeError("EdfImage.fast_read_roi_batch is only valid with other files: %s does not exist" % (filename))
+        location = self._roi_location(coords)
+        if location is None:
+            return
+        if ThreadPoolExecutor is None or workers == 1 or len(filenames) < 2:
+            return [self._read_roi(filename, *location, copy=copy) for filename in filenames]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._read_roi, filename, *location, copy=copy)
+                       for filename in filenames]
+            return [future.result() for future in futures]
+
+    def _roi_location(self, coords):
+        """Returns the position and size of the blob part covering the ROI,
+        the width of the image and the ROI relative to this part.
+
+        :rtype: tuple(int, int, int, tuple(slice, slice))
+        """
         frame = self._frames[self.currentframe]
 
         if len(coords) == 4:
@@ -1147,24 +1718,31 @@ class EdfImage(fabioimage.FabioImage):
             slice1 = coords
         else:
             logger.warning('readROI: Unable to understand Region Of Interest: got %s', coords)
-            return
+            return None
         d1 = self.data.shape[-1]
         start0 = slice1[0].start
-        start1 = slice1[1].start
+        # only the rows of the ROI are read, from their first column so that
+        # the last row does not run past the end of the blob
         slice2 = (slice(0, slice1[0].stop - start0, slice1[0].step),
-                  slice(0, slice1[1].stop - start1, slice1[1].step))
-        start = frame.start + self.bpp * (d1 * start0 + start1)
+                  slice1[1])
+        start = frame.start + self.bpp * d1 * start0
         size = self.bpp * ((slice2[0].stop) * d1)
-        with open(filename, "rb")as f:
-            f.seek(start)
-            raw = f.read(size)
+        return start, size, d1, slice2
+
+    def _read_roi(self, filename, start, size, d1, slice2, copy=True):
+        """Read a ROI located by :meth:`_roi_location` from a file"""
+        data = None
+        frame = self._frames[self.currentframe]
+        rows = slice2[0].stop
+        data = self._memmap_array(filename, start, (rows, d1), frame.swap_needed(), slice2, copy=copy)
+        if data is not None:
+            return data
+        raw = _pread(filename, start, size)
         try:
-            data = numpy.frombuffer(raw, dtype=self.bytecode).copy()
+            data = self._frombuffer(raw, frame.swap_needed(), copy=copy)
             data.shape = -1, d1
         except Exception as error:
             logger.error("unable to convert file content to numpy array: %s", error)
-        if frame.swap_needed():
-            data.byteswap(True)
         return data[slice2]
 
     @deprecation.deprecated(reason="Prefer using 'fast_read_roi'", deprecated_since="0.10.0beta")
@@ -1177,7 +1755,10 @@ class EdfImage(fabioimage.FabioImage):
 
     def _get_any_frame(self):
         """Returns the current if available, else create and return a new empty
-        frame."""
+        frame.
+
+        The getters of the most used properties inline the lookup of the
+        current frame and only call it when the lookup fails."""
         try:
             return self._frames[self.currentframe]
         except AttributeError:
@@ -1216,7 +1797,10 @@ class EdfImage(fabioimage.FabioImage):
 
     @property
     def header(self):
-        frame = self._get_any_frame()
+        try:
+            frame = self._frames[self.currentframe]
+        except (AttributeError, IndexError):
+            frame = self._get_any_frame()
         return frame.header
 
     @header.setter
@@ -1253,17 +1837,26 @@ class EdfImage(fabioimage.FabioImage):
 
     @property
     def shape(self):
-        frame = self._get_any_frame()
+        try:
+            frame = self._frames[self.currentframe]
+        except (AttributeError, IndexError):
+            frame = self._get_any_frame()
         return frame.shape
 
     @property
     def dtype(self):
-        frame = self._get_any_frame()
+        try:
+            frame = self._frames[self.currentframe]
+        except (AttributeError, IndexError):
+            frame = self._get_any_frame()
         return frame.dtype
 
     @property
     def data(self):
-        frame = self._get_any_frame()
+        try:
+            frame = self._frames[self.currentframe]
+        except (AttributeError, IndexError):
+            frame = self._get_any_frame()
         return frame.data
 
     @data.setter
@@ -1388,6 +1981,8 @@ class EdfImage(fabioimage.FabioImage):
         """
         edf = cls()
         infile = edf._open(filename, 'rb')
+        if not cls.USE_MMAP:
+            infile._mmap = False
 
         index = 0
 
@@ -1435,6 +2030,8 @@ class EdfImage(fabioimage.FabioImage):
             try:
                 # read data
                 frame._unpack()
+                # mapped data does not move the file pointer
+                infile.seek(frame.start + blobsize)
             except Exception as error:
                 if isinstance(infile, fabioutils.GzipFile):
                     if compression_module.is_incomplete_gz_block_exception(error):
@@ -1447,7 +2044,8 @@ class EdfImage(fabioimage.FabioImage):
                 infile.close()
                 raise Exception(error)
 
-            frame._check_header_mandatory_keys(filename=filename)
+            if logger.isEnabledFor(logging.INFO):
+                frame._check_header_mandatory_keys(filename=filename, capsHeader=capsHeader)
 
             yield frame
             index += 1
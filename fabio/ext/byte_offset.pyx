@@ -35,14 +35,29 @@ __author__ = "Jerome Kieffer"
 __contact__ = "jerome.kieffer@esrf.eu"
 __license__ = "MIT"
 __copyright__ = "2010-2016, European Synchrotron Radiation Facility, Grenoble, France"
-__date__ = "18/01/2019"
+__date__ = "15/10/2026"
 
 
 cimport numpy as cnumpy
+from libc.stdint cimport uint64_t
+from libc.string cimport memcpy
 import numpy
 import cython
 
 
+cdef inline bint _has_escape(const cnumpy.uint8_t *ptr) nogil:
+    """Tell if any of the 8 bytes at ptr is the 0x80 escape marker.
+
+    SWAR ("SIMD within a register") zero-byte test on the word xor-ed with
+    the marker: portable, and the compiler turns the memcpy into a single
+    unaligned load.
+    """
+    cdef uint64_t word
+    memcpy(&word, ptr, 8)
+    word ^= 0x8080808080808080ULL
+    return ((word - 0x0101010101010101ULL) & ~word & 0x8080808080808080ULL) != 0
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def comp_cbf32(data not None):
@@ -140,141 +155,181 @@ def comp_cbf(data not None):
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def dec_cbf(bytes stream not None, size=None):
+def dec_cbf(stream not None, size=None, out=None):
     """
     Analyze a stream of char with any length of exception (2,4, or 8 bytes integers)
-    :param stream: bytes (string) representing the compressed data
+
+    :param stream: bytes (string) representing the compressed data, or any
+        object exposing a contiguous buffer (memoryview, mmap, ...) which is
+        then read without copy
     :param size: the size of the output array (of longInts)
+    :param out: optional pre-allocated contiguous int64 array receiving the
+        result
     :return: int64 ndArrays
     """
     cdef:
-        int               i = 0
-        int               j = 0
-        cnumpy.uint8_t     tmp8 = 0
-
-        cnumpy.int64_t    last = 0
-        cnumpy.int64_t    current = 0
-        cnumpy.int64_t    tmp64 = 0
-        cnumpy.int64_t    tmp64a = 0
-        cnumpy.int64_t    tmp64b = 0
-        cnumpy.int64_t    tmp64c = 0
-        cnumpy.int64_t    tmp64d = 0
-        cnumpy.int64_t    tmp64e = 0
-        cnumpy.int64_t    tmp64f = 0
-        cnumpy.int64_t    tmp64g = 0
-
-        cnumpy.uint8_t    key8 = 0x80
-        cnumpy.uint8_t    key0 = 0x00
-
-        int csize
-        int lenStream = < int > len(stream)
-        cnumpy.uint8_t[:] cstream = bytearray(stream)
-    if size is None:
-        csize = lenStream
+        Py_ssize_t i = 0
+        Py_ssize_t j = 0
+        Py_ssize_t k
+        Py_ssize_t scalar_end = 0
+        cnumpy.int64_t last = 0
+        cnumpy.int64_t current = 0
+        const cnumpy.uint8_t[::1] cstream = numpy.frombuffer(stream, dtype=numpy.uint8)
+        const cnumpy.uint8_t *cptr
+        Py_ssize_t lenStream = cstream.shape[0]
+        Py_ssize_t csize
+        cnumpy.int64_t[::1] dataOut
+    if out is None:
+        csize = lenStream if size is None else size
+        out = numpy.empty(csize, dtype=numpy.int64)
+        dataOut = out
     else:
-        csize = < int > size
-    cdef cnumpy.ndarray[cnumpy.int64_t, ndim = 1] dataOut = numpy.empty(csize, dtype=numpy.int64)
+        dataOut = out
+        csize = dataOut.shape[0] if size is None else min(size, dataOut.shape[0])
+    if lenStream == 0:
+        return out[:0]
+    cptr = &cstream[0]
     with nogil:
         while (i < lenStream) and (j < csize):
-            if (cstream[i] == key8):
-                if ((cstream[i + 1] == key0) and (cstream[i + 2] == key8)):
-                    if (cstream[i + 3] == key0) and (cstream[i + 4] == key0) and (cstream[i + 5] == key0) and (cstream[i + 6] == key8):
-                        # Retrieve the interesting Bytes of data
-                        tmp64g = cstream[i + 7]
-                        tmp64f = cstream[i + 8]
-                        tmp64e = cstream[i + 9]
-                        tmp64d = cstream[i + 10]
-                        tmp64c = cstream[i + 11]
-                        tmp64b = cstream[i + 12]
-                        tmp64a = cstream[i + 13]
-                        tmp64  = <cnumpy.int8_t> cstream[i + 14]
-                        # Assemble data into a 64 bits integer
-                        current = (tmp64 << 56) | (tmp64a << 48) | (tmp64b << 40) | (tmp64c << 32) | (tmp64d << 24) | (tmp64e << 16) | (tmp64f << 8) | (tmp64g)
+            if (i >= scalar_end) and (i + 8 <= lenStream) and (j + 8 <= csize):
+                if _has_escape(cptr + i):
+                    # Decode this window one value at a time
+                    scalar_end = i + 8
+                else:
+                    # Fast path: 8 consecutive 8-bit deltas
+                    for k in range(8):
+                        last += <cnumpy.int8_t> cptr[i + k]
+                        dataOut[j + k] = last
+                    i += 8
+                    j += 8
+                    continue
+            if cptr[i] == 0x80:
+                if (i + 2 < lenStream) and (cptr[i + 1] == 0x00) and (cptr[i + 2] == 0x80):
+                    if (i + 6 < lenStream) and (cptr[i + 3] == 0x00) and (cptr[i + 4] == 0x00) and (cptr[i + 5] == 0x00) and (cptr[i + 6] == 0x80):
+                        if i + 14 >= lenStream:
+                            break
+                        # Assemble the little-endian data into a 64 bits integer
+                        current = ((<cnumpy.int64_t> <cnumpy.int8_t> cptr[i + 14]) << 56) | \
+                                  ((<cnumpy.int64_t> cptr[i + 13]) << 48) | \
+                                  ((<cnumpy.int64_t> cptr[i + 12]) << 40) | \
+                                  ((<cnumpy.int64_t> cptr[i + 11]) << 32) | \
+                                  ((<cnumpy.int64_t> cptr[i + 10]) << 24) | \
+                                  ((<cnumpy.int64_t> cptr[i + 9]) << 16) | \
+                                  ((<cnumpy.int64_t> cptr[i + 8]) << 8) | \
+                                  (<cnumpy.int64_t> cptr[i + 7])
                         i += 15
                     else:
-                        # Retrieve the interesting Bytes of data
-                        tmp64c = cstream[i + 3]
-                        tmp64b = cstream[i + 4]
-                        tmp64a = cstream[i + 5]
-                        tmp64  = <cnumpy.int8_t> cstream[i + 6]
-                        # Assemble data into a 64 bits integer
-                        current = (tmp64 << 24) | (tmp64a << 16) | (tmp64b << 8) | (tmp64c)
+                        if i + 6 >= lenStream:
+                            break
+                        # Assemble the little-endian data into a 32 bits integer
+                        current = ((<cnumpy.int64_t> <cnumpy.int8_t> cptr[i + 6]) << 24) | \
+                                  ((<cnumpy.int64_t> cptr[i + 5]) << 16) | \
+                                  ((<cnumpy.int64_t> cptr[i + 4]) << 8) | \
+                                  (<cnumpy.int64_t> cptr[i + 3])
                         i += 7
                 else:
-                    tmp64a = cstream[i + 1]
-                    tmp64 = <cnumpy.int8_t> cstream[i + 2]
-
-                    current = (tmp64 << 8) | (tmp64a)
+                    if i + 2 >= lenStream:
+                        break
+                    current = ((<cnumpy.int64_t> <cnumpy.int8_t> cptr[i + 2]) << 8) | \
+                              (<cnumpy.int64_t> cptr[i + 1])
                     i += 3
             else:
-                current = (<cnumpy.int8_t> cstream[i])
+                current = <cnumpy.int8_t> cptr[i]
                 i += 1
             last += current
             dataOut[j] = last
             j += 1
 
-    return dataOut[:j]
+    return out[:j]
 
 
 @cython.boundscheck(False)
-def dec_cbf32(bytes stream not None, size=None):
+@cython.wraparound(False)
+def dec_cbf32(stream not None, size=None, out=None):
     """
-    Analyze a stream of char with any length of exception (2 or 4 bytes integers)
-    Optimized for int32 decompression
+    Analyze a stream of char with any length of exception (2, 4 or 8 bytes
+    integers). Optimized for int32 decompression: values wrap around.
 
-    :param stream: bytes (string) representing the compressed data
+    :param stream: bytes (string) representing the compressed data, or any
+        object exposing a contiguous buffer (memoryview, mmap, ...) which is
+        then read without copy
     :param size: the size of the output array (of longInts)
-    :return: int64 ndArrays
+    :param out: optional pre-allocated contiguous int32 array receiving the
+        result
+    :return: int32 ndArrays
     """
     cdef:
-        int               i = 0
-        int               j = 0
-        cnumpy.uint8_t     tmp8 = 0
-
-        cnumpy.int32_t    last = 0
-        cnumpy.int32_t    current = 0
-        cnumpy.int32_t    tmp64 = 0
-        cnumpy.int32_t    tmp64a = 0
-        cnumpy.int32_t    tmp64b = 0
-        cnumpy.int32_t    tmp64c = 0
-
-        cnumpy.uint8_t    key8 = 0x80
-        cnumpy.uint8_t    key0 = 0x00
-
-        int csize
-        int lenStream = < int > len(stream)
-        cnumpy.uint8_t[:] cstream = bytearray(stream)
-    if size is None:
-        csize = lenStream
+        Py_ssize_t i = 0
+        Py_ssize_t j = 0
+        Py_ssize_t k
+        Py_ssize_t scalar_end = 0
+        cnumpy.int32_t last = 0
+        cnumpy.int32_t current = 0
+        const cnumpy.uint8_t[::1] cstream = numpy.frombuffer(stream, dtype=numpy.uint8)
+        const cnumpy.uint8_t *cptr
+        Py_ssize_t lenStream = cstream.shape[0]
+        Py_ssize_t csize
+        cnumpy.int32_t[::1] dataOut
+    if out is None:
+        csize = lenStream if size is None else size
+        out = numpy.empty(csize, dtype=numpy.int32)
+        dataOut = out
     else:
-        csize = < int > size
-    cdef cnumpy.ndarray[cnumpy.int32_t, ndim = 1] dataOut = numpy.empty(csize, dtype=numpy.int32)
+        dataOut = out
+        csize = dataOut.shape[0] if size is None else min(size, dataOut.shape[0])
+    if lenStream == 0:
+        return out[:0]
+    cptr = &cstream[0]
     with nogil:
         while (i < lenStream) and (j < csize):
-            if (cstream[i] == key8):
-                if ((cstream[i + 1] == key0) and (cstream[i + 2] == key8)):
-                    # Retrieve the interesting Bytes of data
-                    tmp64c = cstream[i + 3]
-                    tmp64b = cstream[i + 4]
-                    tmp64a = cstream[i + 5]
-                    tmp64  = <cnumpy.int8_t> cstream[i + 6]
-                    # Assemble data into a 32 bits integer
-                    current = (tmp64 << 24) | (tmp64a << 16) | (tmp64b << 8) | (tmp64c)
-                    i += 7
+            if (i >= scalar_end) and (i + 8 <= lenStream) and (j + 8 <= csize):
+                if _has_escape(cptr + i):
+                    # Decode this window one value at a time
+                    scalar_end = i + 8
                 else:
-                    tmp64a = cstream[i + 1]
-                    tmp64  = <cnumpy.int8_t> cstream[i + 2]
-
-                    current = (tmp64 << 8) | (tmp64a)
+                    # Fast path: 8 consecutive 8-bit deltas
+                    for k in range(8):
+                        last += <cnumpy.int8_t> cptr[i + k]
+                        dataOut[j + k] = last
+                    i += 8
+                    j += 8
+                    continue
+            if cptr[i] == 0x80:
+                if (i + 2 < lenStream) and (cptr[i + 1] == 0x00) and (cptr[i + 2] == 0x80):
+                    if i + 6 >= lenStream:
+                        break
+                    if (cptr[i + 3] == 0x00) and (cptr[i + 4] == 0x00) and \
+                            (cptr[i + 5] == 0x00) and (cptr[i + 6] == 0x80):
+                        if i + 14 >= lenStream:
+                            break
+                        # 64 bits exception: keep the lower 32 bits as the
+                        # int32 result wraps around anyway
+                        current = ((<cnumpy.int32_t> <cnumpy.int8_t> cptr[i + 10]) << 24) | \
+                                  ((<cnumpy.int32_t> cptr[i + 9]) << 16) | \
+                                  ((<cnumpy.int32_t> cptr[i + 8]) << 8) | \
+                                  (<cnumpy.int32_t> cptr[i + 7])
+                        i += 15
+                    else:
+                        # Assemble the little-endian data into a 32 bits integer
+                        current = ((<cnumpy.int32_t> <cnumpy.int8_t> cptr[i + 6]) << 24) | \
+                                  ((<cnumpy.int32_t> cptr[i + 5]) << 16) | \
+                                  ((<cnumpy.int32_t> cptr[i + 4]) << 8) | \
+                                  (<cnumpy.int32_t> cptr[i + 3])
+                        i += 7
+                else:
+                    if i + 2 >= lenStream:
+                        break
+                    current = ((<cnumpy.int32_t> <cnumpy.int8_t> cptr[i + 2]) << 8) | \
+                              (<cnumpy.int32_t> cptr[i + 1])
                     i += 3
             else:
-                current = (<cnumpy.int8_t> cstream[i])
+                current = <cnumpy.int8_t> cptr[i]
                 i += 1
             last += current
             dataOut[j] = last
             j += 1
 
-    return dataOut[:j]
+    return out[:j]
 
 
 @cython.boundscheck(False)
@@ -47,6 +47,7 @@ import os
 import logging
 import sys
 import json
+import time
 import functools
 
 logger = logging.getLogger(__name__)
@@ -122,6 +123,28 @@ def getnum(name):
         return None
 
 
+RACY_DELAY = 2.0
+"""Files modified less than this number of seconds ago have no reliable
+identity: a rewrite within the resolution of the file system clock could
+keep the same size and modification time"""
+
+
+def file_identity(stat_result):
+    """
+    Returns a key identifying the content of a file, to index caches of
+    data read from it.
+
+    :param stat_result: result of os.stat or os.fstat on the file
+    :return: tuple (device, inode, size, mtime, ctime), None if the file was
+        modified too recently to be identified reliably
+    """
+    if time.time() - stat_result.st_mtime < RACY_DELAY:
+        return None
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size,
+            getattr(stat_result, "st_mtime_ns", stat_result.st_mtime),
+            getattr(stat_result, "st_ctime_ns", stat_result.st_ctime))
+
+
 COMPRESSED_EXTENSIONS = set(["gz", "bz2"])
 """Set of compressed file extensions provided by Fabio"""
 
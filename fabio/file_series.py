@@ -53,7 +53,7 @@ import collections
 logger = logging.getLogger(__name__)
 
 import fabio
-from .fabioutils import FilenameObject, next_filename
+from .fabioutils import FilenameObject, next_filename, StringTypes
 from .openimage import openimage
 from .fabioimage import FabioImage
 from .utils import deprecation
@@ -584,6 +584,8 @@ class FileSeries(FabioImage):
             self.__file_descriptions = []
 
         self.__nframes = None
+        self.__codec_class = None
+        self.__codec_extension = None
         self.use_edf_shortcut = True
         """If true a custom file sequencial file reader is used for EDF formats"""
 
@@ -625,7 +627,7 @@ class FileSeries(FabioImage):
                     continue
 
             # Default implementation
-            with fabio.open(filename) as image:
+            with self.__open_file(filename) as image:
                 if image.nframes == 0:
                     # The container is empty
                     pass
@@ -694,9 +696,35 @@ class FileSeries(FabioImage):
         if self.__current_fabio_file is not None:
             self.__current_fabio_file.close()
         self.__current_fabio_file_index = file_number
-        self.__current_fabio_file = fabio.open(filename)
+        self.__current_fabio_file = self.__open_file(filename)
         return self.__current_fabio_file
 
+    def __open_file(self, filename):
+        """Open a file of the file series.
+
+        The files of a series usually share the same format: when the
+        extension matches, the codec which read the previous file is tried
+        first, without detecting the format again.
+
+        :param str filename: Filename of the file
+        :rtype: FabioImage
+        """
+        extension = None
+        if isinstance(filename, StringTypes):
+            extension = os.path.splitext(filename)[1]
+        if self.__codec_class is not None and extension == self.__codec_extension:
+            image = self.__codec_class()
+            try:
+                return image.read(filename)
+            except Exception:
+                logger.debug("Backtrace", exc_info=True)
+                image.close()
+        image = fabio.open(filename)
+        if image is not None and extension is not None:
+            self.__codec_class = image.__class__
+            self.__codec_extension = extension
+        return image
+
     def __iter_file_descriptions(self):
         """Iter all file descriptions.
 
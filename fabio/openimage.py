@@ -44,9 +44,17 @@ from __future__ import with_statement, print_function, absolute_import
 
 import os.path
 import logging
+import threading
 logger = logging.getLogger(__name__)
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
 from . import fabioutils
-from .fabioutils import FilenameObject, BytesIO, NotGoodReader
+from .fabioutils import FilenameObject, NotGoodReader, OrderedDict
 from .fabioimage import FabioImage
 
 # Make sure to load all formats
@@ -98,29 +106,227 @@ MAGIC_NUMBERS = [
 ]
 
 
+def _resolve_eiger_hdf5(filename):
+    if "::" in filename:
+        return ["hdf5"]
+    return ["eiger", "soleil"]
+
+
+def _resolve_marccd_tif(filename):
+    # only the extensions of the file matter, not the ones of its directories
+    if "mccd" in os.path.basename(filename).split("."):
+        return ["marccd"]
+    return ["tif"]
+
+
+_MAGIC_RESOLVERS = {"eiger/hdf5": _resolve_eiger_hdf5,
+                    "marccd/tif": _resolve_marccd_tif}
+"""Functions choosing the formats from the filename, for magic numbers
+shared by several formats"""
+
+_MAGIC_BY_FIRST_BYTE = {}
+"""Magic numbers of MAGIC_NUMBERS grouped by their first byte, the longest
+(most specific) first"""
+
+_MAGIC_COUNT = None
+"""Length of MAGIC_NUMBERS when _MAGIC_BY_FIRST_BYTE was built"""
+
+
+def _get_magic_by_first_byte():
+    """Returns the magic numbers grouped by first byte, rebuilt when entries
+    were added to or removed from MAGIC_NUMBERS."""
+    global _MAGIC_BY_FIRST_BYTE, _MAGIC_COUNT, MAGIC_LENGTH
+    if _MAGIC_COUNT != len(MAGIC_NUMBERS):
+        by_first_byte = {}
+        for magic, format_type in MAGIC_NUMBERS:
+            resolver = _MAGIC_RESOLVERS.get(format_type)
+            by_first_byte.setdefault(magic[0:1], []).append((magic, format_type, resolver))
+        for candidates in by_first_byte.values():
+            # stable: same length magics keep the order of MAGIC_NUMBERS
+            candidates.sort(key=lambda item: -len(item[0]))
+        _MAGIC_BY_FIRST_BYTE = by_first_byte
+        _MAGIC_COUNT = len(MAGIC_NUMBERS)
+        MAGIC_LENGTH = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+    return _MAGIC_BY_FIRST_BYTE
+
+
+MAGIC_LENGTH = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+"""Number of bytes needed to recognize any of the MAGIC_NUMBERS, updated
+with the dispatch table"""
+
+
 def do_magic(byts, filename):
     """ Try to interpret the bytes starting the file as a magic number """
-    for magic, format_type in MAGIC_NUMBERS:
+    # single byte slices are cached by the interpreter: no allocation
+    for magic, format_type, resolver in _get_magic_by_first_byte().get(byts[0:1], ()):
         if byts.startswith(magic):
-            if "/" in format_type:
-                if format_type == "eiger/hdf5":
-                    if "::" in filename:
-                        return ["hdf5"]
-                    else:
-                        return ["eiger", "soleil"]
-                elif format_type == "marccd/tif":
-                    if "mccd" in filename.split("."):
-                        return ["marccd"]
-                    else:
-                        return ["tif"]
+            if resolver is not None:
+                return resolver(filename)
             return [format_type]
     return None
 
 
+_COMPRESSED_FORMATS = {".edf": ["edf"],
+                       ".cbf": ["cbf"]}
+"""Formats of compressed files given by the extension preceding the
+compression one, when it can not be mistaken"""
+
+
+def _get_compressed_filetypes(filename):
+    """Returns the formats of a compressed file from its name only, which
+    saves decompressing its beginning to read the magic number.
+
+    :param str filename: name of the file
+    :return: list of format names, None if the name is not enough
+    """
+    stem, extension = os.path.splitext(filename)
+    if extension not in (".gz", ".bz2"):
+        return None
+    filetypes = _COMPRESSED_FORMATS.get(os.path.splitext(stem)[1].lower())
+    if filetypes is None:
+        return None
+    return list(filetypes)
+
+
+def _read_magic_bytes(filename):
+    """Read the first bytes of a file, enough for any of the MAGIC_NUMBERS.
+
+    Plain files are read with a single unbuffered read, compressed files
+    through `FabioImage._open`.
+
+    :raises IOError: if the file can not be read
+    """
+    if (not isinstance(filename, fabioutils.StringTypes) or
+            os.path.splitext(filename)[-1] in (".gz", ".bz2")):
+        imo = FabioImage()
+        with imo._open(filename) as f:
+            return f.read(MAGIC_LENGTH)
+    try:
+        fd = os.open(filename, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except OSError as error:
+        # Python 2 does not merge OSError into IOError
+        raise IOError(error.errno, error.strerror, filename)
+    try:
+        return os.read(fd, MAGIC_LENGTH)
+    finally:
+        os.close(fd)
+
+
+_FILETYPES_CACHE = OrderedDict()
+"""Formats detected from the magic numbers of the files recently opened,
+indexed by filename and file identity"""
+
+_FILETYPES_CACHE_SIZE = 512
+"""Maximum number of files kept in the detection cache"""
+
+_FILETYPES_LOCK = threading.Lock()
+
+
+def _detect_filetypes(actual_filename, filename, stream=None, stat_result=None):
+    """Detect the formats of a file from its magic number.
+
+    The result is cached for plain files, as long as they are not modified.
+
+    :param actual_filename: name of the file, unused if stream is provided
+    :param filename: name given by the user, which can contain a "::"
+        suffix helping to choose the format
+    :param stream: file object already opened on the file, the magic number
+        is read from it and it is rewound, instead of opening the file again
+    :param stat_result: result of `os.stat` on filename if already known
+    :return: list of format names, None if no magic number matches
+    :raises IOError: if the file can not be read
+    """
+    cache_key = None
+    # with a "::" suffix the formats depend on more than the file
+    if (_FILETYPES_CACHE_SIZE > 0 and actual_filename is filename and
+            isinstance(filename, fabioutils.StringTypes)):
+        identity = None
+        if stat_result is None:
+            try:
+                stat_result = os.stat(filename)
+            except OSError:
+                pass
+        if stat_result is not None:
+            identity = fabioutils.file_identity(stat_result)
+        if identity is not None:
+            cache_key = (filename,) + identity
+            with _FILETYPES_LOCK:
+                filetypes = _FILETYPES_CACHE.pop(cache_key, None)
+                if filetypes is not None:
+                    _FILETYPES_CACHE[cache_key] = filetypes
+            if filetypes is not None:
+                return list(filetypes)
+
+    # updates MAGIC_LENGTH if MAGIC_NUMBERS changed
+    _get_magic_by_first_byte()
+    try:
+        if stream is not None:
+            magic_bytes = stream.read(MAGIC_LENGTH)
+            stream.seek(0)
+        else:
+            magic_bytes = _read_magic_bytes(actual_filename)
+    except IOError:
+        logger.debug("Backtrace", exc_info=True)
+        raise
+    filetypes = do_magic(magic_bytes, filename)
+
+    if cache_key is not None and filetypes is not None:
+        with _FILETYPES_LOCK:
+            _FILETYPES_CACHE[cache_key] = tuple(filetypes)
+            while len(_FILETYPES_CACHE) > _FILETYPES_CACHE_SIZE:
+                _FILETYPES_CACHE.popitem(last=False)
+    return filetypes
+
+
+_FORMAT_CLASS_NAMES = {}
+"""Codec class names indexed by the format names returned by `do_magic`"""
+
+
+def _get_format_class(filetype):
+    """Returns the codec class reading a format detected by `do_magic`.
+
+    Only the codec name is cached: the class itself is looked up in the
+    registry, which can be updated at any time.
+
+    :param filetype: format name, for example "edf", or a list of one
+        format name as guessed from the file extension
+    :return: the codec class, None if it is not registered
+    """
+    if not isinstance(filetype, fabioutils.StringTypes):
+        filetype = "".join(filetype)
+    klass_name = _FORMAT_CLASS_NAMES.get(filetype)
+    if klass_name is None:
+        klass_name = filetype + "image"
+        _FORMAT_CLASS_NAMES[filetype] = klass_name
+    return fabioformats.get_class_by_name(klass_name)
+
+
+def identify_many(filenames, workers=None):
+    """Identify the formats of several files from their magic numbers.
+
+    The files are read concurrently by a pool of threads, which hides the
+    latency of networked filesystems when scanning large directories.
+
+    :param filenames: list of filenames
+    :param int workers: number of threads, the default of the executor if None
+    :return: list with, for each file, the list of candidate format names
+        (as returned by `do_magic`), or None if no magic number matches
+    :raises IOError: if a file can not be read
+    """
+    filenames = list(filenames)
+
+    def identify_one(filename):
+        return _detect_filetypes(filename, filename)
+
+    if ThreadPoolExecutor is None or workers == 1 or len(filenames) < 2:
+        return [identify_one(filename) for filename in filenames]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(identify_one, filenames))
+
+
 def openimage_str(filename, frame):
     logger.debug("Attempting to open %s" % (filename))
-    objs = _openimage(filename)
-    for obj in objs:
+    for obj in _iter_candidates(filename):
         try:
             return obj.read(filename, frame)
         except NotGoodReader as ex:
@@ -130,7 +336,7 @@ def openimage_str(filename, frame):
 def openimage_PathTypes(filename, frame):
     if not isinstance(filename, fabioutils.StringTypes):
         filename = str(filename)
-    openimage_str(filename, frame)
+    return openimage_str(filename, frame)
 
 def openimage_FilenameObject(filename, frame):
     try:
@@ -151,19 +357,22 @@ def openimage(filename, frame=None):
             print(i.nframes)
             print(i.data)
 
-    :param Union[str,FilenameObject] filename: A filename or a filename
-        iterator.
+    :param Union[str,FilenameObject] filename: A filename, a filename
+        iterator or a seekable file object.
     :param Union[int,None] frame: A specific frame inside this file.
     :rtype: FabioImage
+    :raises TypeError: if filename is none of these
     """
     if isinstance(filename, str):
         return openimage_str(filename, frame)
-    elif isinstance(filename, unicode):
-        return openimage_str(str(filename), frame)
     elif isinstance(filename, fabioutils.PathTypes):
         return openimage_PathTypes(filename, frame)
     elif isinstance(filename, FilenameObject):
         return openimage_FilenameObject(filename, frame)
+    elif hasattr(filename, "seek") and hasattr(filename, "read"):
+        return openimage_str(filename, frame)
+    else:
+        raise TypeError("Unsupported type of filename (found %s)" % type(filename))
 
 def openheader(filename):
     """ return only the header"""
@@ -171,53 +380,91 @@ def openheader(filename):
         if not isinstance(filename, fabioutils.StringTypes):
             filename = str(filename)
 
-    objs = _openimage(filename)
-    for obj in objs:
+    stream = None
+    if isinstance(filename, fabioutils.StringTypes):
+        # the same file object is used to read the magic number and the header
         try:
-            obj.readheader(obj.filename)
-            return obj
-        except NotGoodReader:
-            pass
+            stream = FabioImage()._open(filename)
+        except IOError:
+            # for example "file::format", _openimage deals with it
+            stream = None
 
-def _openimage(filename):
+    try:
+        for obj in _iter_candidates(filename, stream):
+            try:
+                if stream is None:
+                    obj.readheader(obj.filename)
+                else:
+                    stream.seek(0)
+                    obj.readheader(stream)
+                return obj
+            except NotGoodReader:
+                pass
+    finally:
+        if stream is not None:
+            stream.close()
+
+def _openimage(filename, stream=None):
     """
     determine which format for a filename
     and return appropriate class which can be used for opening the image
 
+    See `_iter_candidates`, which creates the objects one at a time.
+
+    :rtype: list of FabioImage
+    """
+    return list(_iter_candidates(filename, stream))
+
+
+def _iter_candidates(filename, stream=None):
+    """
+    determine which format for a filename and yield the objects which
+    can be used for opening the image, the most likely first.
+
+    Each object is only created when the previous one was rejected.
+
     :param filename: can be an url like:
 
     hdf5:///example.h5?entry/instrument/detector/data/data#slice=[:,:,5]
 
+    :param stream: file object already opened on filename, used to read
+        the magic number
     """
+    stat_result = None
+    magic_name = filename
     if hasattr(filename, "seek") and hasattr(filename, "read"):
         # Looks to be a file containing filenames
-        if not isinstance(filename, BytesIO):
-            filename.seek(0)
-            actual_filename = BytesIO(filename.read())
+        # only the magic number is read, the stream is rewound for the reader
+        filename.seek(0)
+        actual_filename = None
+        stream = filename
+        magic_name = getattr(filename, "name", "")
+        if not isinstance(magic_name, fabioutils.StringTypes):
+            magic_name = ""
     else:
-        if os.path.exists(filename):
+        # a single stat serves both as existence test and as cache key
+        try:
+            stat_result = os.stat(filename)
+        except OSError:
+            stat_result = None
+        if stat_result is not None:
             # Already a valid filename
             actual_filename = filename
-        elif "::" in filename:
-            actual_filename = filename.split("::")[0]
         else:
-            actual_filename = filename
+            # strip the "::" suffix, if any
+            actual_filename = filename.partition("::")[0]
 
-    try:
-        imo = FabioImage()
-        with imo._open(actual_filename) as f:
-            magic_bytes = f.read(18)
-    except IOError:
-        logger.debug("Backtrace", exc_info=True)
-        raise
-    else:
-        imo = None
+    filetypes = None
+    if stat_result is not None:
+        filetypes = _get_compressed_filetypes(filename)
+    if filetypes is None:
+        filetypes = _detect_filetypes(actual_filename, magic_name, stream, stat_result)
 
-    filetypes = do_magic(magic_bytes, filename)
     if filetypes is None:
-        logger.debug("Backtrace", exc_info=True)
+        logger.debug("No magic number matches %s, guessing from its name", filename)
         try:
-            file_obj = FilenameObject(filename=filename)
+            # magic_name is the name of the stream when filename is one
+            file_obj = FilenameObject(filename=magic_name)
             if file_obj is None:
                 raise Exception("Unable to deconstruct filename")
             if (file_obj.format is not None) and\
@@ -229,29 +476,28 @@ def _openimage(filename):
                 filetypes = [file_obj.format]
         except Exception:
             logger.debug("Backtrace", exc_info=True)
-            raise IOError("Fabio could not identify " + filename)
+            raise IOError("Fabio could not identify %s" % (magic_name or filename))
 
     if filetypes is None:
-        raise IOError("Fabio could not identify " + filename)
+        raise IOError("Fabio could not identify %s" % (magic_name or filename))
 
-    objs = []
+    found = False
     for filetype in filetypes:
-        klass_name = "".join(filetype) + 'image'
+        klass = _get_format_class(filetype)
+        if klass is None:
+            continue
         try:
-            obj = fabioformats.factory(klass_name)
-            objs.append(obj)
-        except (RuntimeError, Exception):
-            pass
-
-    if len(objs) == 0:
-        logger.debug("Backtrace", exc_info=True)
-        raise IOError("Filename %s can't be read as format %s" % (filename, filetypes))
-
-    for obj in objs:
+            obj = klass()
+        except Exception:
+            logger.debug("Backtrace", exc_info=True)
+            continue
+        found = True
         obj.filename = filename
+        # skip the read for read header
+        yield obj
 
-    # skip the read for read header
-    return objs
+    if not found:
+        raise IOError("Filename %s can't be read as format %s" % (filename, filetypes))
 
 def open_series(filenames=None, first_filename=None,
                 single_frame=None, fixed_frames=None, fixed_frame_number=None):
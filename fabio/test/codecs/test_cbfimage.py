@@ -35,12 +35,16 @@ from __future__ import print_function, with_statement, division, absolute_import
 import unittest
 import os
 import time
+import gzip
+import pickle
 import logging
+import numpy
 
 logger = logging.getLogger(__name__)
 
 import fabio
-from fabio.cbfimage import cbfimage
+from fabio.cbfimage import cbfimage, CIF, read_many
+from fabio.ext._cif import split_tokens
 from fabio.compression import decByteOffset_numpy, decByteOffset_cython
 from ..utilstest import UtilsTest
 
@@ -155,10 +159,158 @@ class TestCbfReader(unittest.TestCase):
             self.assertEqual(obj.header[key], other.header[key], "value are the same for key %s [%s|%s]" % (key, obj.header[key], other.header[key]))
 
 
+class TestCbfRoundTrip(unittest.TestCase):
+    """Write and read back CBF files without reference images"""
+
+    def setUp(self):
+        self.data = numpy.random.poisson(50, size=(37, 53)).astype(numpy.int32)
+        self.data[3, 5] = 1 << 20
+        self.data[7, 11] = -1 << 20
+        self.data[9, 13] = 300
+        self.filename = os.path.join(UtilsTest.tempdir, "roundtrip.cbf")
+        cbfimage(data=self.data).write(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+    def test_read(self):
+        obj = fabio.open(self.filename)
+        self.assertEqual(obj.shape, self.data.shape)
+        self.assertEqual(obj.data.dtype, self.data.dtype)
+        self.assertTrue(numpy.array_equal(obj.data, self.data))
+
+    def test_dtypes(self):
+        for dtype in (numpy.int8, numpy.uint8, numpy.int16, numpy.uint16,
+                      numpy.uint32, numpy.int64):
+            info = numpy.iinfo(dtype)
+            data = numpy.arange(self.data.size).reshape(self.data.shape).astype(dtype)
+            data[0, 0] = info.max
+            data[0, 1] = info.min
+            data[0, 2] = info.max
+            cbfimage(data=data).write(self.filename)
+            obj = fabio.open(self.filename)
+            self.assertEqual(obj.data.dtype, data.dtype)
+            self.assertTrue(numpy.array_equal(obj.data, data), dtype)
+
+    def test_compressed(self):
+        gzname = self.filename + ".gz"
+        with open(self.filename, "rb") as f:
+            with gzip.open(gzname, "wb") as g:
+                g.write(f.read())
+        try:
+            obj = fabio.open(gzname)
+            self.assertTrue(numpy.array_equal(obj.data, self.data))
+        finally:
+            os.unlink(gzname)
+
+    def test_out(self):
+        out = numpy.zeros(self.data.shape, dtype=numpy.int32)
+        obj = cbfimage().read(self.filename, out=out)
+        self.assertTrue(numpy.array_equal(out, self.data))
+        self.assertTrue(numpy.shares_memory(obj.data, out))
+        out = numpy.zeros(self.data.size, dtype=numpy.float64)
+        obj = cbfimage().read(self.filename, out=out)
+        self.assertTrue(numpy.array_equal(obj.data, self.data))
+        self.assertRaises(ValueError, cbfimage().read, self.filename, out=out[:-1])
+        buffers = []
+
+        def allocator(shape, dtype):
+            buffers.append(numpy.empty(shape, dtype=dtype))
+            return buffers[-1]
+
+        obj = cbfimage().read(self.filename, allocator=allocator)
+        self.assertEqual(buffers[0].shape, self.data.shape)
+        self.assertEqual(buffers[0].dtype, self.data.dtype)
+        self.assertTrue(numpy.shares_memory(obj.data, buffers[0]))
+        self.assertTrue(numpy.array_equal(obj.data, self.data))
+
+    def test_out_uint32(self):
+        data = numpy.arange(self.data.size, dtype=numpy.uint32).reshape(self.data.shape)
+        data[0, 0] = 4000000000
+        data[1, 1] = numpy.iinfo(numpy.uint32).max
+        cbfimage(data=data).write(self.filename)
+        for dtype in (numpy.int64, numpy.float64, numpy.uint32):
+            out = numpy.zeros(data.shape, dtype=dtype)
+            cbfimage().read(self.filename, out=out)
+            self.assertTrue(numpy.array_equal(out, data), dtype)
+
+    def test_read_many(self):
+        images = read_many([self.filename] * 3, workers=2)
+        self.assertEqual(len(images), 3)
+        for image in images:
+            self.assertTrue(numpy.array_equal(image.data, self.data))
+        out = numpy.zeros((3,) + self.data.shape, dtype=numpy.int32)
+        read_many([self.filename] * 3, out=out)
+        self.assertTrue(numpy.array_equal(out[2], self.data))
+        self.assertRaises(ValueError, read_many, [self.filename], out=out)
+
+    def test_split(self):
+        """The pure python tokenizer matches the cython one"""
+        with open(self.filename, "rb") as f:
+            text = f.read()
+        text += b"""
+_single 'a quoted string'
+_double "another 'quoted' string"
+_text
+;
+multi-line
+text ; field
+;
+# a comment
+_hash no#comment
+"""
+        self.assertEqual(CIF._splitCIF(text), split_tokens(text))
+
+    def test_loop(self):
+        """Loops read from a CIF file behave like lists of rows"""
+        ciffile = os.path.join(UtilsTest.tempdir, "loop.cif")
+        with open(ciffile, "w") as f:
+            f.write("""data_loop
+_title 'loop test'
+loop_
+_x
+_y
+1 a
+2 b
+""")
+        try:
+            cif1 = CIF(ciffile)
+            cif2 = CIF(ciffile)
+        finally:
+            os.unlink(ciffile)
+        self.assertEqual(cif1, cif2)
+        loops = cif1["loop_"]
+        self.assertEqual(pickle.loads(pickle.dumps(loops)), loops)
+        rows = loops[0][1]
+        self.assertEqual(rows, [{b"_x": b"1", b"_y": b"a"}, {b"_x": b"2", b"_y": b"b"}])
+        rows.append({b"_x": b"3", b"_y": b"c"})
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2], {b"_x": b"3", b"_y": b"c"})
+        self.assertNotEqual(cif1, cif2)
+        del rows[0]
+        self.assertEqual(rows[0], {b"_x": b"2", b"_y": b"b"})
+        self.assertRaises(ValueError, rows.append, {b"_x": b"4"})
+
+    def test_cbs(self):
+        obj = cbfimage()
+        obj.read(self.filename)
+        raw = cbfimage().read(self.filename, only_raw=True)
+        start = obj.cbs.find(obj.STARTER) + len(obj.STARTER)
+        self.assertEqual(obj.cbs[start:], raw)
+
+    def test_raw(self):
+        raw = cbfimage().read(self.filename, only_raw=True)
+        self.assertTrue(isinstance(raw, bytes))
+        self.assertTrue(numpy.array_equal(decByteOffset_numpy(raw), self.data.ravel()))
+        self.assertTrue(numpy.array_equal(decByteOffset_cython(raw, self.data.size), self.data.ravel()))
+
+
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     testsuite = unittest.TestSuite()
     testsuite.addTest(loadTests(TestCbfReader))
+    testsuite.addTest(loadTests(TestCbfRoundTrip))
     return testsuite
 
 
@@ -30,6 +30,7 @@
 from __future__ import print_function, with_statement, division, absolute_import
 import unittest
 import os
+import time
 import numpy
 import shutil
 import io
@@ -38,7 +39,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 import fabio
-from ...edfimage import edfimage
+from ...edfimage import edfimage, BLOCKSIZE
+from ...compression import compByteOffset
 from ...third_party import six
 from ...fabioutils import GzipFile, BZ2File
 from ..utilstest import UtilsTest
@@ -216,6 +218,39 @@ class TestEdfCompressedData(unittest.TestCase):
         self.assertEqual((ref.data - compressed.data).max(), 0, "Zlib compressed data block is correct")
 
 
+class TestEdfByteOffset(unittest.TestCase):
+    """
+    Read data blocks compressed with the byte offset algorithm from CBF
+    """
+    def write(self, data, datatype, stream):
+        header = "{\nHeaderID = EH:000001:000000:000000 ;\nImage = 1 ;\n" \
+                 "ByteOrder = LowByteFirst ;\nDataType = %s ;\n" \
+                 "Dim_1 = %i ;\nDim_2 = %i ;\nSize = %i ;\n" \
+                 "Compression = BYTE_OFFSET ;\n" % (datatype, data.shape[1], data.shape[0], len(stream))
+        header += " " * (BLOCKSIZE - 2 - len(header)) + "}\n"
+        filename = os.path.join(UtilsTest.tempdir, "byte_offset_%s.edf" % datatype)
+        with open(filename, "wb") as f:
+            f.write(header.encode("ascii") + stream)
+        self.addCleanup(os.unlink, filename)
+        return filename
+
+    def test_read(self):
+        ref = numpy.array([[5, -300, 70000, 3], [-2, 0, 1, 40000]])
+        for datatype, dtype in (("SignedInteger", "int32"), ("Signed64", "int64"), ("FloatValue", "float32")):
+            stream = compByteOffset(ref.ravel())
+            data = fabio.open(self.write(ref, datatype, stream)).data
+            self.assertEqual(data.dtype, numpy.dtype(dtype))
+            self.assertTrue(numpy.array_equal(data, ref.astype(dtype)), datatype)
+
+    def test_wrap(self):
+        """64 bits exceptions in a 32 bits dataset"""
+        ref = numpy.array([[0, 4000000000, 7, 3000000000]], dtype="uint32")
+        stream = compByteOffset(ref.ravel().astype("int64"))
+        data = fabio.open(self.write(ref, "UnsignedInteger", stream)).data
+        self.assertEqual(data.dtype, numpy.dtype("uint32"))
+        self.assertTrue(numpy.array_equal(data, ref))
+
+
 class TestEdfMultiFrame(unittest.TestCase):
     """
     Read some test images with their data-block compressed.
@@ -293,6 +328,17 @@ class TestEdfFastRead(unittest.TestCase):
         obt = ref.fast_read_data(self.fastFilename)
         self.assertEqual(abs(obt - refdata).max(), 0, "testedffastread: Same data")
 
+    def test_fastread_roi_batch(self):
+        ref = fabio.open(self.refFilename)
+        refdata = ref.data
+        coords = (slice(10, 50), slice(20, 30))
+        obt = ref.fast_read_roi(self.fastFilename, coords)
+        self.assertEqual(abs(obt - refdata[coords]).max(), 0, "fast_read_roi: Same data")
+        batch = ref.fast_read_roi_batch([self.fastFilename] * 3, coords)
+        self.assertEqual(len(batch), 3)
+        for obt in batch:
+            self.assertEqual(abs(obt - refdata[coords]).max(), 0, "fast_read_roi_batch: Same data")
+
 
 class TestEdfWrite(unittest.TestCase):
     """
@@ -331,6 +377,34 @@ class TestEdfWrite(unittest.TestCase):
         self.assertTrue(abs(r.data - self.data).max() == 0, "data are OK")
         self.assertEqual(int(r.header["EDF_HeaderSize"]), 512, "header size is one 512 block")
 
+    def test_read_all_data(self):
+        self.filename = os.path.join(self.tmpdir, "read_all_data.edf")
+        e = edfimage(data=self.data, header=self.header)
+        for i in range(1, 5):
+            e.append_frame(data=self.data + i)
+        e.write(self.filename)
+        r = fabio.open(self.filename)
+        datasets = r.read_all_data(workers=2)
+        self.assertEqual(len(datasets), 5)
+        for i, data in enumerate(datasets):
+            self.assertTrue(numpy.array_equal(data, self.data + i))
+            self.assertIs(data, r.getframe(i).data)
+        r.close()
+
+    def test_no_mmap(self):
+        self.filename = os.path.join(self.tmpdir, "no_mmap.edf")
+        e = edfimage(data=self.data, header=self.header)
+        e.append_frame(data=self.data + 1)
+        e.write(self.filename)
+        for use_mmap in (True, False):
+            for copy in (True, False):
+                r = edfimage()
+                r.read(self.filename, use_mmap=use_mmap, copy=copy)
+                self.assertTrue(numpy.array_equal(r.data, self.data))
+                self.assertTrue(numpy.array_equal(r.getframe(1).data, self.data + 1))
+                self.assertEqual(r._frames[0]._mapped, use_mmap and not copy)
+                r.close()
+
     def tearDown(self):
         os.unlink(self.filename)
 
@@ -360,6 +434,120 @@ class TestEdfRegression(unittest.TestCase):
 
         del obj
 
+    def test_rewrite_mapped(self):
+        """Data read from a file stays valid when this file is rewritten"""
+        data = numpy.arange(64 * 48, dtype="int32").reshape(48, 64)
+        fname = os.path.join(UtilsTest.tempdir, "rewrite_mapped.edf")
+        e = edfimage(data=data)
+        e.append_frame(data=data[::-1].copy())
+        e.write(fname)
+        del e
+
+        obj = fabio.open(fname)
+        obj.data[0, 0] = -1
+        obj.header["missing"] = "blah"
+        obj.write(fname)
+        del obj
+
+        obj = fabio.open(fname)
+        self.assertEqual(obj.nframes, 2)
+        self.assertEqual(obj.data[0, 0], -1)
+        self.assertTrue(numpy.array_equal(obj.data[1:], data[1:]))
+        self.assertTrue(numpy.array_equal(obj.getframe(1).data, data[::-1]))
+        os.unlink(fname)
+
+    def test_rewrite_hard_link(self):
+        """Rewriting a file updates all its hard links"""
+        if not hasattr(os, "link"):
+            self.skipTest("No hard links")
+        data = numpy.arange(64 * 48, dtype="int32").reshape(48, 64)
+        fname = os.path.join(UtilsTest.tempdir, "rewrite_link.edf")
+        link = os.path.join(UtilsTest.tempdir, "rewrite_link2.edf")
+        edfimage(data=data).write(fname)
+        os.link(fname, link)
+        try:
+            obj = fabio.open(fname)
+            obj.data = data + 1
+            obj.write(fname)
+            obj.close()
+            self.assertEqual(os.stat(fname).st_nlink, 2)
+            self.assertTrue(numpy.array_equal(fabio.open(link).data, data + 1))
+        finally:
+            os.unlink(link)
+            os.unlink(fname)
+
+    def test_rewrite_read_data(self):
+        """Data read from a file do not change when the file is rewritten"""
+        data = numpy.arange(64 * 48, dtype="uint16").reshape(48, 64)
+        fname = os.path.join(UtilsTest.tempdir, "rewrite_read_data.edf")
+        edfimage(data=data).write(fname)
+        for use_mmap in (True, False):
+            obj = edfimage()
+            obj.read(fname, use_mmap=use_mmap)
+            read_data = obj.data
+            edfimage(data=data * 2).write(fname)
+            self.assertTrue(numpy.array_equal(read_data, data))
+            edfimage(data=data).write(fname)
+            obj.close()
+        os.unlink(fname)
+
+    def test_fast_read_roi_last_rows(self):
+        """A ROI ending on the last row but not at the first column"""
+        data = numpy.arange(64 * 48, dtype="int32").reshape(48, 64)
+        fname = os.path.join(UtilsTest.tempdir, "fast_read_roi.edf")
+        edfimage(data=data).write(fname)
+        obj = fabio.open(fname)
+        coords = (slice(40, 48), slice(10, 64, 3))
+        roi = obj.fast_read_roi(fname, coords)
+        self.assertTrue(numpy.array_equal(roi, data[coords]))
+        obj.close()
+        os.unlink(fname)
+
+    def test_frame_index_cache(self):
+        """Reopening a file gives the same frames, and independent headers"""
+        data = numpy.arange(64 * 48, dtype="int32").reshape(48, 64)
+        fname = os.path.join(UtilsTest.tempdir, "frame_index_cache.edf")
+        e = edfimage(data=data, header={"key": "value"})
+        e.append_frame(data=data.astype("float32"))
+        e.write(fname)
+        del e
+        # old enough to be cached
+        old = time.time() - 60
+        os.utime(fname, (old, old))
+
+        ref = fabio.open(fname)
+        obj = fabio.open(fname)
+        self.assertEqual(obj.nframes, 2)
+        for frame_ref, frame in zip(ref._frames, obj._frames):
+            self.assertEqual(frame.header, frame_ref.header)
+            self.assertEqual(frame.data.dtype, frame_ref.data.dtype)
+            self.assertTrue(numpy.array_equal(frame.data, frame_ref.data))
+        obj.header["key"] = "modified"
+        self.assertEqual(fabio.open(fname).header["key"], "value")
+        ref.close()
+        obj.close()
+        os.unlink(fname)
+
+    def test_foreign_byte_order(self):
+        data = numpy.arange(-50, 50, dtype="int32").reshape(10, 10)
+        fname = os.path.join(UtilsTest.tempdir, "foreign_byte_order.edf")
+        if numpy.little_endian:
+            byte_order, swapped = "HighByteFirst", data.astype(">i4")
+        else:
+            byte_order, swapped = "LowByteFirst", data.astype("<i4")
+        header = "{\nHeaderID = EH:000001:000000:000000 ;\nImage = 1 ;\n" \
+                 "ByteOrder = %s ;\nDataType = SignedInteger ;\n" \
+                 "Dim_1 = 10 ;\nDim_2 = 10 ;\nSize = 400 ;\n" % byte_order
+        header += " " * (510 - len(header)) + "}\n"
+        for opener, ext in ((open, ""), (GzipFile, ".gz")):
+            with opener(fname + ext, "wb") as f:
+                f.write(header.encode("ascii") + swapped.tobytes())
+            obj = fabio.open(fname + ext)
+            self.assertEqual(obj.data.dtype, numpy.dtype("int32"))
+            self.assertTrue(numpy.array_equal(obj.data, data), ext)
+            obj.close()
+            os.unlink(fname + ext)
+
     def test_remove_metadata_header(self):
         filename = UtilsTest.getimage("face.edf.bz2")[0:-4]
         output_filename = os.path.join(UtilsTest.tempdir, "test_remove_metadata_header.edf")
@@ -631,6 +819,7 @@ def suite():
     testsuite.addTest(loadTests(TestGzipEdf))
     testsuite.addTest(loadTests(TestEdfs))
     testsuite.addTest(loadTests(TestEdfCompressedData))
+    testsuite.addTest(loadTests(TestEdfByteOffset))
     testsuite.addTest(loadTests(TestEdfMultiFrame))
     testsuite.addTest(loadTests(TestEdfFastRead))
     testsuite.addTest(loadTests(TestEdfWrite))
@@ -31,14 +31,17 @@ from __future__ import print_function, with_statement, division, absolute_import
 
 import unittest
 import os
+import struct
+import gzip
 import logging
+import numpy
 
 from ..utilstest import UtilsTest
 
 
 logger = logging.getLogger(__name__)
 
-from fabio.GEimage import GEimage
+from fabio.GEimage import GEimage, GE_HEADER_INFO
 
 # filename dim1 dim2 min max mean stddev
 TESTIMAGES = """GE_aSI_detector_image_1529      2048 2048 1515 16353 1833.0311 56.9124
@@ -71,10 +74,162 @@ class TestGE(unittest.TestCase):
             self.assertEqual(shape, obj.shape)
 
 
+def write_ge(filename, data, depth=16):
+    """Write a minimal multi-frame GE file from a 3D uint16 array"""
+    nframes, rows, cols = data.shape
+    header_size = sum(nbytes for _, nbytes, _ in GE_HEADER_INFO)
+    values = {"StandardHeaderSizeInBytes": header_size,
+              "UserHeaderSizeInBytes": 0,
+              "NumberOfFrames": nframes,
+              "NumberOfRowsInFrame": rows,
+              "NumberOfColsInFrame": cols,
+              "ImageDepthInBits": depth}
+    with open(filename, "wb") as f:
+        for name, nbytes, fmt in GE_HEADER_INFO:
+            if fmt is None:
+                f.write(b"\x00" * nbytes)
+            else:
+                f.write(struct.pack(fmt, values.get(name, 0)))
+        if depth == 12:
+            pixels = data.astype(numpy.uint16).ravel()
+            even, odd = pixels[0::2], pixels[1::2]
+            packed = numpy.empty((len(even), 3), dtype=numpy.uint8)
+            packed[:, 0] = even & 0xFF
+            packed[:, 1] = (even >> 8) | ((odd & 0x0F) << 4)
+            packed[:, 2] = odd >> 4
+            f.write(packed.tobytes())
+        else:
+            f.write(data.astype("<u2").tobytes())
+
+
+class TestGeMultiFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(UtilsTest.tempdir, "ge_multiframe.ge")
+        shape = (5, 6, 11)
+        self.data = numpy.arange(numpy.prod(shape), dtype=numpy.uint16).reshape(shape)
+        write_ge(self.filename, self.data)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+    def test_read(self):
+        obj = GEimage()
+        obj.read(self.filename)
+        self.assertEqual(obj.nframes, 5)
+        self.assertEqual(obj.shape, (6, 11))
+        self.assertTrue(numpy.array_equal(obj.data, self.data[0]))
+        obj.data[0, 0] = 1  # data have to be writable
+
+    def test_getframe(self):
+        obj = GEimage()
+        obj.read(self.filename, 2)
+        self.assertTrue(numpy.array_equal(obj.data, self.data[2]))
+        for i in range(obj.nframes):
+            frame = obj.getframe(i)
+            self.assertEqual(frame.currentframe, i)
+            self.assertEqual(frame.filename, "%s$%04d" % (self.filename, i))
+            self.assertTrue(numpy.array_equal(frame.data, self.data[i]))
+        self.assertRaises(IndexError, obj.getframe, obj.nframes)
+        self.assertRaises(IndexError, obj.getframe, -1)
+
+    def test_frames_not_shared(self):
+        obj = GEimage()
+        obj.read(self.filename)
+        obj.data -= 1
+        self.assertTrue(numpy.array_equal(obj.getframe(0).data, self.data[0]))
+        obj.advance(1)
+        obj.advance(-1)
+        self.assertTrue(numpy.array_equal(obj.data, self.data[0]))
+        frame = obj.getframe(1)
+        frame.data[...] = 0
+        self.assertTrue(numpy.array_equal(obj.getframe(1).data, self.data[1]))
+
+    def test_read_frames(self):
+        obj = GEimage()
+        obj.read(self.filename)
+        self.assertTrue(numpy.array_equal(obj.read_frames(), self.data))
+        indices = [3, 1, 2, 4]
+        self.assertTrue(numpy.array_equal(obj.read_frames(indices), self.data[indices]))
+        self.assertRaises(IndexError, obj.read_frames, [5])
+
+    def test_12bits(self):
+        data = (self.data * 37) % 4096
+        write_ge(self.filename, data, depth=12)
+        obj = GEimage()
+        obj.read(self.filename, 3)
+        self.assertTrue(numpy.array_equal(obj.data, data[3]))
+        self.assertTrue(numpy.array_equal(obj.read_frames([4, 0]), data[[4, 0]]))
+
+    def test_compressed(self):
+        gzname = self.filename + ".gz"
+        with open(self.filename, "rb") as f:
+            with gzip.open(gzname, "wb") as g:
+                g.write(f.read())
+        try:
+            obj = GEimage()
+            obj.read(gzname, 1)
+            self.assertTrue(numpy.array_equal(obj.data, self.data[1]))
+            self.assertTrue(numpy.array_equal(obj.getframe(4).data, self.data[4]))
+            self.assertTrue(numpy.array_equal(obj.read_frames(), self.data))
+            indices = [4, 0, 1, 3]
+            self.assertTrue(numpy.array_equal(obj.read_frames(indices), self.data[indices]))
+            data = obj.data
+            obj.next(copy=False)
+            self.assertIs(obj.data, data)
+            self.assertTrue(numpy.array_equal(obj.data, self.data[2]))
+            # the file is re-opened on demand once closed
+            obj.close()
+            self.assertTrue(numpy.array_equal(obj.getframe(3).data, self.data[3]))
+            obj.close()
+        finally:
+            os.unlink(gzname)
+
+    def test_frame_cache(self):
+        gzname = self.filename + ".gz"
+        with open(self.filename, "rb") as f:
+            with gzip.open(gzname, "wb") as g:
+                g.write(f.read())
+        try:
+            obj = GEimage(cache_frames=2)
+            obj.read(gzname)
+            frame1 = obj.getframe(1)
+            self.assertTrue(numpy.array_equal(frame1.data, self.data[1]))
+            self.assertIs(obj.getframe(1).data, frame1.data)
+            self.assertFalse(frame1.data.flags.writeable)
+            obj.getframe(2)
+            obj.getframe(3)
+            self.assertEqual(list(obj._frame_cache.keys()), [2, 3])
+            self.assertTrue(numpy.array_equal(obj.getframe(1).data, self.data[1]))
+            obj.close()
+        finally:
+            os.unlink(gzname)
+
+    def test_next_previous(self):
+        obj = GEimage()
+        obj.read(self.filename, 2)
+        self.assertTrue(numpy.array_equal(obj.next().data, self.data[3]))
+        self.assertTrue(numpy.array_equal(obj.previous().data, self.data[1]))
+        self.assertEqual(obj.currentframe, 2)
+
+    def test_advance(self):
+        obj = GEimage()
+        obj.read(self.filename)
+        for i in range(1, obj.nframes):
+            self.assertIs(obj.next(copy=False), obj)
+            self.assertEqual(obj.currentframe, i)
+            self.assertTrue(numpy.array_equal(obj.data, self.data[i]))
+            self.assertEqual(obj.getmax(), self.data[i].max())
+        self.assertIs(obj.advance(-3), obj)
+        self.assertTrue(numpy.array_equal(obj.data, self.data[1]))
+
+
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     testsuite = unittest.TestSuite()
     testsuite.addTest(loadTests(TestGE))
+    testsuite.addTest(loadTests(TestGeMultiFrame))
     return testsuite
 
 
@@ -363,6 +363,26 @@ class TestFileSeries(unittest.TestCase):
         self.assertEqual(serie.nframes, 10)
         serie.close()
 
+    def test_mixed_formats(self):
+        # same extension but not the same format: the codec of the
+        # previous file must not be used blindly
+        data0 = numpy.zeros((8, 8), dtype=numpy.int32)
+        data1 = numpy.ones((4, 5), dtype=numpy.int32)
+        filenames = [self.get_filename("image_d_000.dat"),
+                     self.get_filename("image_d_001.dat"),
+                     self.get_filename("image_d_002.dat")]
+        fabio.edfimage.EdfImage(data=data0).write(filenames[0])
+        with open(filenames[1], "wb") as f:
+            numpy.save(f, data1)
+        fabio.edfimage.EdfImage(data=data1).write(filenames[2])
+        serie = FileSeries(filenames=filenames, single_frame=True)
+        self.assertEqual(serie.get_frame(0).data.shape, (8, 8))
+        self.assertEqual(serie.get_frame(1).data.shape, (4, 5))
+        self.assertEqual(serie.get_frame(2).data.shape, (4, 5))
+        serie.close()
+        frames = [frame.data.shape for frame in FileSeries(filenames=filenames).frames()]
+        self.assertEqual(frames, [(8, 8), (4, 5), (4, 5)])
+
 
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
@@ -29,6 +29,7 @@ Test frame concept of FabioImage
 
 """
 
+import os
 import unittest
 import logging
 import numpy
@@ -260,6 +261,31 @@ class TestFileSeries(_CommonTestFrames):
         return meta
 
 
+class TestFrameStats(unittest.TestCase):
+    """The statistics cache of _FabioArray works on frames"""
+
+    def check_stats(self, frame):
+        frame.resetvals()
+        self.assertEqual(frame.getmean(), 2.25)
+        self.assertEqual(frame.getmax(), 4)
+        self.assertAlmostEqual(frame.getstddev(), numpy.sqrt(1.6875))
+
+    def test_fabio_frame(self):
+        data = numpy.array([[1, 1], [3, 4]], dtype=numpy.uint16)
+        self.check_stats(fabio.fabioimage.FabioFrame(data, {}))
+
+    def test_edf_frame(self):
+        data = numpy.array([[1, 1], [3, 4]], dtype=numpy.uint16)
+        filename = os.path.join(UtilsTest.tempdir, "frame_stats.edf")
+        fabio.edfimage.EdfImage(data=data).write(filename)
+        image = fabio.open(filename)
+        try:
+            self.check_stats(image._get_frame(0))
+        finally:
+            image.close()
+            os.unlink(filename)
+
+
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     testsuite = unittest.TestSuite()
@@ -268,6 +294,7 @@ def suite():
     testsuite.addTest(loadTests(TestEdf))
     testsuite.addTest(loadTests(TestTiff))
     testsuite.addTest(loadTests(TestFileSeries))
+    testsuite.addTest(loadTests(TestFrameStats))
     return testsuite
 
 
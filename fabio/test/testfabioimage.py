@@ -205,21 +205,20 @@ class TestPilImage(unittest.TestCase):
                 testdata = self.mkdata(shape, typ)
                 img = FabioImage(testdata, {"title": "Random data"})
                 pim = img.toPIL16()
-                for i in [0, 5, 6, shape[1] - 1]:
-                    for j in [0, 5, 7, shape[0] - 1]:
-                        errstr = str(typ) + " %d %d %f %f t=%s" % (
-                            i, j, testdata[j, i], pim.getpixel((i, j)), typ)
+                pixels = numpy.asarray(pim, dtype=numpy.float64)
+                self.assertEqual(pixels.shape, shape)
+                data = img.data.astype(numpy.float64)
 
-                        er1 = img.data[j, i] - pim.getpixel((i, j))
-                        er2 = img.data[j, i] + pim.getpixel((i, j))
+                er1 = data - pixels
+                er2 = data + pixels
 
-                        # difference as % error in case of rounding
-                        if er2 != 0.:
-                            err = er1 / er2
-                        else:
-                            err = er1
+                # difference as % error in case of rounding
+                nonzero = er2 != 0.
+                err = er1.copy()
+                err[nonzero] /= er2[nonzero]
 
-                        self.assertAlmostEqual(err, 0, 6, errstr)
+                errstr = "%s max relative error %s" % (typ, abs(err).max())
+                self.assertTrue((abs(err) < 5e-7).all(), errstr)
 
 
 class TestPilImage2(TestPilImage):
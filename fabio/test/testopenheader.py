@@ -27,12 +27,18 @@ Jerome Kieffer, 04/12/2014
 """
 from __future__ import print_function, with_statement, division, absolute_import
 
+import os
+import gzip
+import shutil
 import unittest
 import logging
+import numpy
 
 logger = logging.getLogger(__name__)
 
 from fabio.openimage import openheader
+from fabio.edfimage import edfimage
+from fabio.fabioutils import BytesIO
 from .utilstest import UtilsTest
 
 
@@ -52,10 +58,39 @@ class Test1(unittest.TestCase):
                              "Error on file %s" % name)
 
 
+class TestLocalFiles(unittest.TestCase):
+    """openheader on files written by fabio"""
+    def setUp(self):
+        self.name = os.path.join(UtilsTest.tempdir, "openheader.edf")
+        data = numpy.arange(12, dtype=numpy.uint16).reshape(3, 4)
+        edfimage(data=data, header={"title": "openheader"}).write(self.name)
+        with open(self.name, "rb") as fin:
+            with gzip.open(self.name + ".gz", "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+
+    def tearDown(self):
+        for name in (self.name, self.name + ".gz"):
+            if os.path.exists(name):
+                os.unlink(name)
+
+    def test_header(self):
+        for name in (self.name, self.name + ".gz"):
+            obj = openheader(name)
+            self.assertEqual(obj.header["title"], "openheader", name)
+            self.assertEqual(obj.shape, (3, 4))
+
+    def test_stream(self):
+        with open(self.name, "rb") as f:
+            content = f.read()
+        obj = openheader(BytesIO(content))
+        self.assertEqual(obj.header["title"], "openheader")
+
+
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     testsuite = unittest.TestSuite()
     testsuite.addTest(loadTests(Test1))
+    testsuite.addTest(loadTests(TestLocalFiles))
     return testsuite
 
 
@@ -29,13 +29,27 @@ Jerome Kieffer 04/12/2014
 """
 from __future__ import print_function, with_statement, division, absolute_import
 
+import os
+import io
+import gzip
 import unittest
 import logging
+import numpy
+
+try:
+    import pathlib
+except ImportError:
+    try:
+        import pathlib2 as pathlib
+    except ImportError:
+        pathlib = None
 
 logger = logging.getLogger(__name__)
 
-from fabio.openimage import openimage
+import fabio.openimage
+from fabio.openimage import openimage, do_magic, identify_many
 from fabio.edfimage import EdfImage
+from fabio.cbfimage import CbfImage
 from fabio.marccdimage import MarccdImage
 from fabio.fit2dmaskimage import Fit2dMaskImage
 from fabio.OXDimage import OXDimage
@@ -219,6 +233,123 @@ class TestOpenOxd(unittest.TestCase):
         self.checkFile(filename)
 
 
+class TestMagic(unittest.TestCase):
+    """do_magic dispatch on the first bytes of a file"""
+
+    def test_specific_first(self):
+        self.assertEqual(do_magic(b"{\nHEADER_BYTES=", "a.img"), ["dtrek"])
+        self.assertEqual(do_magic(b"{\nHeaderID = ", "a.edf"), ["edf"])
+        self.assertEqual(do_magic(b"II*\x00\x82\x00\x00\x00", "a.tif"), ["pilatus"])
+        self.assertEqual(do_magic(b"II*\x00\x08\x00\x00\x00", "a.mccd"), ["marccd"])
+        self.assertEqual(do_magic(b"II*\x00\x08\x00\x00\x00", "a.tif"), ["tif"])
+        path = os.path.join("run.mccd", "a.tif")
+        self.assertEqual(do_magic(b"II*\x00\x08\x00\x00\x00", path), ["tif"])
+        self.assertEqual(do_magic(b"II*\x00\x10\x00\x00\x00", "a.tif"), ["tif"])
+
+    def test_unknown(self):
+        self.assertIsNone(do_magic(b"", "a"))
+        self.assertIsNone(do_magic(b"\xFF\xD8\xFF\x00", "a"))
+
+    def test_long_magic(self):
+        magic = b"{" + b"long magic number" * 3
+        name = os.path.join(UtilsTest.tempdir, "long_magic")
+        with open(name, "wb") as f:
+            f.write(magic)
+        fabio.openimage.MAGIC_NUMBERS.insert(0, (magic, "dtrek"))
+        try:
+            self.assertEqual(identify_many([name]), [["dtrek"]])
+        finally:
+            fabio.openimage.MAGIC_NUMBERS.pop(0)
+            os.unlink(name)
+        self.assertEqual(do_magic(magic, name), ["edf"])
+
+    def test_identify_many(self):
+        names = []
+        for i, content in enumerate([b"{\nHeaderID = EH:000001:000000:000000 ;",
+                                     b"\x93NUMPY",
+                                     b"unknown"]):
+            name = os.path.join(UtilsTest.tempdir, "identify_many_%d" % i)
+            with open(name, "wb") as f:
+                f.write(content)
+            names.append(name)
+        try:
+            for workers in (1, 2):
+                self.assertEqual(identify_many(names, workers=workers),
+                                 [["edf"], ["numpy"], None])
+        finally:
+            for name in names:
+                os.unlink(name)
+
+
+class TestOpenPath(unittest.TestCase):
+    """openimage with the different types of filenames"""
+
+    def setUp(self):
+        self.filename = os.path.join(UtilsTest.tempdir, "open_path.edf")
+        self.data = numpy.arange(12, dtype=numpy.uint16).reshape(3, 4)
+        EdfImage(data=self.data).write(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+    def test_str(self):
+        obj = openimage(self.filename)
+        self.assertTrue(numpy.array_equal(obj.data, self.data))
+
+    def test_compressed(self):
+        filename = self.filename + ".gz"
+        with open(self.filename, "rb") as fin:
+            with gzip.open(filename, "wb") as fout:
+                fout.write(fin.read())
+        try:
+            obj = openimage(filename)
+            self.assertIsInstance(obj, EdfImage)
+            self.assertTrue(numpy.array_equal(obj.data, self.data))
+            obj.close()
+        finally:
+            os.unlink(filename)
+
+    def test_file_object(self):
+        with open(self.filename, "rb") as f:
+            obj = openimage(f)
+            self.assertIsInstance(obj, EdfImage)
+            self.assertTrue(numpy.array_equal(obj.data, self.data))
+
+    def test_stream_without_magic(self):
+        # fabio-written CBF files start with a comment, not with a magic number
+        filename = os.path.join(UtilsTest.tempdir, "open_path.cbf")
+        CbfImage(data=self.data.astype(numpy.int32)).write(filename)
+        try:
+            with open(filename, "rb") as f:
+                obj = openimage(f)
+                self.assertIsInstance(obj, CbfImage)
+                self.assertTrue(numpy.array_equal(obj.data, self.data))
+            with open(filename, "rb") as f:
+                stream = io.BytesIO(f.read())
+            stream.name = filename
+            obj = openimage(stream)
+            self.assertIsInstance(obj, CbfImage)
+            self.assertTrue(numpy.array_equal(obj.data, self.data))
+        finally:
+            os.unlink(filename)
+
+    def test_unknown_stream(self):
+        with open(self.filename, "rb") as f:
+            stream = io.BytesIO(b"# no magic number" + f.read())
+        self.assertRaises(IOError, openimage, stream)
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, openimage, 5)
+
+    def test_pathlib(self):
+        if pathlib is None:
+            self.skipTest("pathlib is not available")
+        obj = openimage(pathlib.Path(self.filename))
+        self.assertIsNotNone(obj)
+        self.assertTrue(numpy.array_equal(obj.data, self.data))
+
+
 def suite():
     loadTests = unittest.defaultTestLoader.loadTestsFromTestCase
     testsuite = unittest.TestSuite()
@@ -228,6 +359,8 @@ def suite():
     testsuite.addTest(loadTests(TestOpenMask))
     testsuite.addTest(loadTests(TestOpenMccd))
     testsuite.addTest(loadTests(TestOpenOxd))
+    testsuite.addTest(loadTests(TestMagic))
+    testsuite.addTest(loadTests(TestOpenPath))
     return testsuite
 
 
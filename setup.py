@@ -442,7 +442,7 @@ class Build(_build):
 
     def finalize_options(self):
         _build.finalize_options(self)
-        self.finalize_cython_options(min_version='0.21.1')
+        self.finalize_cython_options(min_version='0.28')
         self.finalize_openmp_options()
 
     def _parse_env_as_bool(self, key):